@@ -2,13 +2,15 @@
 
 from __future__ import division, print_function
 import numpy as np
+import bisect
 
 __author__ = "Marcos Duarte, https://github.com/demotu/BMC"
 __version__ = "1.0.4"
 __license__ = "MIT"
 
 def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising',
-                 kpsh=False, valley=False, show=False, ax=None):
+                 kpsh=False, valley=False, show=False, ax=None,
+                 mpd_method='sweep'):
 
     """Detect peaks in data based on their amplitude and other features.
 
@@ -35,6 +37,11 @@ def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising',
     show : bool, optional (default = False)
         if True (1), plot data in matplotlib figure.
     ax : a matplotlib.axes.Axes instance, optional (default = None).
+    mpd_method : {'sweep', 'mask'}, optional (default = 'sweep')
+        how peaks closer than `mpd` are removed: 'sweep' keeps a Fenwick tree
+        of the kept peaks (O(P log P) in the number of peaks P), 'mask' is the
+        original O(P^2) boolean mask loop. Both return the same indexes
+        (see scripts/check_detect_peaks.py).
 
     Returns
     -------
@@ -108,7 +115,7 @@ def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising',
     # handle NaN's
     if ind.size and indnan.size:
         # NaN's and values close to NaN's cannot be peaks
-        ind = ind[np.in1d(ind, np.unique(np.hstack((indnan, indnan-1, indnan+1))), invert=True)]
+        ind = ind[np.isin(ind, np.unique(np.hstack((indnan, indnan-1, indnan+1))), invert=True)]
     # first and last values of x cannot be peaks
     if ind.size and ind[0] == 0:
         ind = ind[1:]
@@ -123,16 +130,13 @@ def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising',
         ind = np.delete(ind, np.where(dx < threshold)[0])
     # detect small peaks closer than minimum peak distance
     if ind.size and mpd > 1:
-        ind = ind[np.argsort(x[ind])][::-1]  # sort ind by peak height
-        idel = np.zeros(ind.size, dtype=bool)
-        for i in range(ind.size):
-            if not idel[i]:
-                # keep peaks with the same height if kpsh is True
-                idel = idel | (ind >= ind[i] - mpd) & (ind <= ind[i] + mpd) \
-                    & (x[ind[i]] > x[ind] if kpsh else True)
-                idel[i] = 0  # Keep current peak
-        # remove the small peaks and sort back the indexes by their occurrence
-        ind = np.sort(ind[~idel])
+        if mpd_method == 'sweep':
+            ind = _suppress_mpd_sweep(x, ind, mpd, kpsh)
+        elif mpd_method == 'mask':
+            ind = _suppress_mpd_mask(x, ind, mpd, kpsh)
+        else:
+            raise ValueError("mpd_method must be 'sweep' or 'mask', not %r"
+                             % (mpd_method,))
 
     if show:
         if indnan.size:
@@ -143,6 +147,217 @@ def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising',
 
     return ind
 
+def _suppress_mpd_mask(x, ind, mpd, kpsh):
+    """Remove peaks closer than `mpd` to a higher peak, O(P^2) original."""
+    ind = ind[np.argsort(x[ind])][::-1]  # sort ind by peak height
+    idel = np.zeros(ind.size, dtype=bool)
+    for i in range(ind.size):
+        if not idel[i]:
+            # keep peaks with the same height if kpsh is True
+            idel = idel | (ind >= ind[i] - mpd) & (ind <= ind[i] + mpd) \
+                & (x[ind[i]] > x[ind] if kpsh else True)
+            idel[i] = 0  # Keep current peak
+    # remove the small peaks and sort back the indexes by their occurrence
+    return np.sort(ind[~idel])
+
+
+def _suppress_mpd_sweep(x, ind, mpd, kpsh):
+    """Remove peaks closer than `mpd` to a higher peak, O(P log P).
+
+    Visits peaks from highest to lowest, in the same order as
+    `_suppress_mpd_mask`, keeping a peak only if no kept peak lies within
+    `mpd` of it. The range of peaks within `mpd` of each peak is found
+    once with `searchsorted`, and a Fenwick tree of kept peak counts over
+    the (sorted) peaks tells in O(log P) whether a range holds a kept one.
+    With `kpsh`, peaks are only added to the tree once all peaks of the
+    same height have been checked, so equal peaks don't suppress each other.
+    """
+    order = np.argsort(x[ind])[::-1].tolist()  # positions in ind, highest peak first
+    heights = x[ind][order].tolist()
+    lo = np.searchsorted(ind, ind - mpd, side='left').tolist()
+    hi = np.searchsorted(ind, ind + mpd, side='right').tolist()
+    size = ind.size
+    tree = [0] * (size + 1)  # Fenwick tree of kept peaks
+
+    def add(pos):
+        pos += 1
+        while pos <= size:
+            tree[pos] += 1
+            pos += pos & -pos
+
+    def count(pos):  # kept peaks at positions < pos
+        total = 0
+        while pos > 0:
+            total += tree[pos]
+            pos -= pos & -pos
+        return total
+
+    keep = np.zeros(size, dtype=bool)
+    pending = []  # kept peaks of the current height, if kpsh
+    for i, pos in enumerate(order):
+        if kpsh and pending and heights[i] != heights[i - 1]:
+            for kept_pos in pending:
+                add(kept_pos)
+            pending = []
+        if count(hi[pos]) - count(lo[pos]):
+            continue  # a higher peak is too close
+        keep[pos] = True
+        if kpsh:
+            pending.append(pos)
+        else:
+            add(pos)
+    return ind[keep]
+
+
+class StreamingPeakDetector(object):
+    """Detect peaks in a stream of data, as `detect_peaks` does for an array.
+
+    Samples are fed one at a time or in chunks with `update`, which returns
+    the peaks that have become final: a peak is confirmed once the sample
+    after it is known and no candidate within `mpd` of it (including ones
+    still to come) can be higher. `flush` confirms the rest at the end of
+    the stream. Only the last two samples and the undecided candidates are
+    kept, so memory doesn't grow with the stream.
+
+    Parameters
+    ----------
+    mph, mpd, threshold, edge, kpsh, valley :
+        as in `detect_peaks`. Peaks of the same height closer than `mpd`
+        keep the later one (`detect_peaks` may keep either, its sort by
+        height isn't stable).
+
+    Examples
+    --------
+    >>> detector = StreamingPeakDetector(mpd=20, valley=True)
+    >>> for chunk in chunks:
+    >>>     for ind, x, y in detector.update(chunk):
+    >>>         print(ind, y)
+    >>> confirmed = detector.flush()
+    """
+
+    def __init__(self, mph=None, mpd=1, threshold=0, edge='rising',
+                 kpsh=False, valley=False):
+        self.mph = mph
+        self.mpd = mpd
+        self.threshold = threshold
+        self.edge = edge
+        self.kpsh = kpsh
+        self.valley = valley
+        self.count = 0  # samples seen
+        self._tail = np.array([])  # last two samples
+        self._tail_x = None  # x values of last two samples
+        self._pending = []  # undecided candidates (ind, x, y), by ind
+        self._kept = []  # confirmed peaks (ind, x, y) within mpd of pending
+
+    def update(self, samples, x=None):
+        """Add samples (and optional x values, e.g. times, for them).
+
+        Returns
+        -------
+        confirmed : list
+            (ind, x, y) of every newly confirmed peak, in `ind` order;
+            `ind` counts samples since the start of the stream and `x`
+            is `ind` if no x values are given.
+        """
+        samples = np.atleast_1d(samples).astype('float64')
+        if x is None:
+            x = np.arange(self.count, self.count + samples.size)
+        data = np.hstack((self._tail, -samples if self.valley else samples))
+        xs = np.atleast_1d(x)
+        if self._tail_x is not None:
+            xs = np.hstack((self._tail_x, xs))
+        start = self.count - self._tail.size  # stream index of data[0]
+        self.count += samples.size
+        self._tail, self._tail_x = data[-2:], xs[-2:]
+
+        for i in self._candidates(data):
+            y = -data[i] if self.valley else data[i]
+            self._pending.append((start + i, xs[i], y))
+        # a candidate needs the sample after it, so the last sample can't be
+        # one yet:
+        return self._decide(self.count - 2)
+
+    def flush(self):
+        """Confirm the remaining peaks, at the end of the stream."""
+        return self._decide(None)
+
+    def _candidates(self, data):
+        """Indexes of `data` that are peaks before the `mpd` check."""
+        if data.size < 3:
+            return np.array([], dtype=int)
+        before, after = np.diff(data)[:-1], np.diff(data)[1:]
+        # NaN's and values close to NaN's cannot be peaks
+        nan = np.isnan(data)
+        valid = ~(nan[:-2] | nan[1:-1] | nan[2:])
+        before[~valid] = after[~valid] = 0
+        if not self.edge:
+            peak = (after < 0) & (before > 0)
+        else:
+            peak = np.zeros(before.size, dtype=bool)
+            if self.edge.lower() in ['rising', 'both']:
+                peak |= (after <= 0) & (before > 0)
+            if self.edge.lower() in ['falling', 'both']:
+                peak |= (after < 0) & (before >= 0)
+        peak &= valid
+        if self.mph is not None:
+            peak[valid] &= data[1:-1][valid] >= self.mph
+        if self.threshold > 0:
+            peak &= np.minimum(before, -after) >= self.threshold
+        return np.where(peak)[0] + 1
+
+    def _decide(self, horizon):
+        """Confirm or drop pending candidates, with samples up to
+        `horizon` (or all samples, if None) known."""
+        if self.mpd <= 1:
+            confirmed, self._pending = self._pending, []
+            return confirmed
+
+        sign = -1 if self.valley else 1
+        # highest first, later of equal peaks first:
+        ranked = sorted(self._pending, key=lambda c: (sign*c[2], c[0]),
+                        reverse=True)
+        kept = [c[0] for c in self._kept]  # sorted by ind
+        old_kept = dict((c[0], sign*c[2]) for c in self._kept)
+        undecided = []  # sorted by ind
+        confirmed, undecided_c = [], []
+        group = []  # (candidate, is kept) of current height, if kpsh
+
+        def close(inds, ind, height=None):
+            pos = bisect.bisect_left(inds, ind - self.mpd)
+            if height is None:
+                return pos < len(inds) and inds[pos] <= ind + self.mpd
+            # with kpsh, only peaks kept before this call can be as high
+            for near in inds[pos:bisect.bisect_right(inds, ind + self.mpd)]:
+                if old_kept.get(near, np.inf) > height:
+                    return True
+            return False
+
+        for i, c in enumerate(ranked):
+            if self.kpsh and group and c[2] != ranked[i - 1][2]:
+                # equal peaks don't suppress each other with kpsh
+                for g, is_kept in group:
+                    bisect.insort(kept if is_kept else undecided, g[0])
+                group = []
+            if close(kept, c[0], sign*c[2] if self.kpsh else None):
+                continue  # a higher peak is too close
+            is_kept = not (close(undecided, c[0]) or
+                           horizon is not None and c[0] + self.mpd > horizon)
+            (confirmed if is_kept else undecided_c).append(c)
+            if self.kpsh:
+                group.append((c, is_kept))
+            else:
+                bisect.insort(kept if is_kept else undecided, c[0])
+
+        confirmed.sort()
+        self._pending = sorted(undecided_c)
+        # peaks that can still suppress pending or future candidates:
+        first = self._pending[0][0] if self._pending else \
+            (horizon + 1 if horizon is not None else self.count)
+        self._kept = [c for c in sorted(self._kept + confirmed)
+                      if c[0] + self.mpd >= first]
+        return confirmed
+
+
 def _plot(x, mph, mpd, threshold, edge, valley, ax, ind):
     """Plot results of the detect_peaks function, see its help."""
     try:
@@ -170,4 +385,5 @@ def _plot(x, mph, mpd, threshold, edge, valley, ax, ind):
         ax.set_title("%s (mph=%s, mpd=%d, threshold=%s, edge='%s')"
                      % (mode, str(mph), mpd, str(threshold), edge))
         # plt.grid()
-        plt.show()
\ No newline at end of file
+        plt.show()
+
@@ -12,15 +12,19 @@ named PythonRobotics. (27 Nov. 2017; NP)
 """
 import numpy as np
 import math
+import logging
 import matplotlib.pyplot as plt
+from scipy.spatial import cKDTree
 
 
+logger = logging.getLogger(__name__)
+
 
 
 class State(object):
 
-    def __init__(self, x=0.0, y=0.0, yaw=0.0, v=0.0):
-        self.dt = 0.2  # time step for model [s]
+    def __init__(self, x=0.0, y=0.0, yaw=0.0, v=0.0, dt=0.2):
+        self.dt = dt  # time step for model [s]
         self.L = 2.9  # [m]
         self.x = x
         self.y = y
@@ -40,15 +44,117 @@ class State(object):
 
 
 
+class BatchState(object):
+    """
+    States of K rovers (or K parameter sets of one rover) as
+    numpy arrays, advanced together by one vectorized kinematic
+    update, e.g., for Monte-Carlo runs of the controller.
+    """
+
+    def __init__(self, x, y, yaw=0.0, v=0.0, dt=0.2):
+        self.dt = dt  # time step for model [s]
+        self.L = 2.9  # [m]
+        self.x = np.array(x, dtype=np.float64)
+        self.y = np.array(y, dtype=np.float64)
+        self.yaw = self.x * 0.0 + yaw
+        self.v = self.x * 0.0 + v
+
+
+    def __len__(self):
+        return len(self.x)
+
+
+    def update(self, a, delta, active=None):
+        """
+        Same kinematics as State.update for every rover,
+        rovers where active is False are left as is.
+        """
+        x = self.x + self.v * np.cos(self.yaw) * self.dt
+        y = self.y + self.v * np.sin(self.yaw) * self.dt
+        yaw = self.yaw + self.v / self.L * np.tan(delta) * self.dt
+        v = self.v + a * self.dt
+
+        if active is None:
+            self.x, self.y, self.yaw, self.v = x, y, yaw, v
+        else:
+            self.x = np.where(active, x, self.x)
+            self.y = np.where(active, y, self.y)
+            self.yaw = np.where(active, yaw, self.yaw)
+            self.v = np.where(active, v, self.v)
+
+        return self
+
+
+
+
+class Course(object):
+    """
+    A course (cx, cy) preprocessed once for path following:
+    a KD-tree spatial index for O(log N) nearest point lookups,
+    and the cumulative arc-length along the course so finding the
+    look-ahead target is a single searchsorted. Can be shared by
+    many runs over the same course (e.g., look-ahead sweeps).
+    """
+    def __init__(self, cx, cy):
+
+        self.cx = np.asarray(cx, dtype=np.float64)
+        self.cy = np.asarray(cy, dtype=np.float64)
+        self.points = np.column_stack((self.cx, self.cy))
+        self.tree = cKDTree(self.points)
+
+        # cumulative distance along course at each point, s[0] = 0:
+        self.s = np.zeros(len(self.cx))
+        self.s[1:] = np.cumsum(np.hypot(np.diff(self.cx), np.diff(self.cy)))
+
+
+    def __len__(self):
+        return len(self.cx)
+
+
+    def nearest(self, x, y):
+        """
+        Index of the course point closest to (x, y).
+        """
+        _, ind = self.tree.query((x, y))
+        return int(ind)
+
+
+    def nearest_in_window(self, x, y, pind, window):
+        """
+        Index of the course point closest to (x, y), only
+        searching within window points of the previous index pind.
+        """
+        start = max(pind - window, 0)
+        stop = min(pind + window + 1, len(self.points))
+        d = self.points[start:stop] - (x, y)
+        return start + int(np.argmin(d[:, 0] ** 2 + d[:, 1] ** 2))
+
+
+    def look_ahead_index(self, ind, Lf):
+        """
+        Index of the first point at least Lf along the
+        course from point ind (last point if course is shorter).
+        ind and Lf can also be arrays, for batches of rovers.
+        """
+        target = np.searchsorted(self.s, self.s[ind] + Lf, side='left')
+        target = np.minimum(np.maximum(target, ind), len(self.s) - 1)
+        if np.ndim(target) == 0:
+            return int(target)
+        return target
+
+
+
+
 class PurePursuitModel(object):
     """
     "Classifying" the pure pursuit model to be used
     by the red rover model
     """
-    def __init__(self, Lf=1.0, Kp=1.0):
+    def __init__(self, Lf=1.0, Kp=1.0, search_window=None):
 
         self.Kp = Kp  # speed propotional gain
         self.Lf = Lf  # look-ahead distance
+        self.search_window = search_window  # num pts around previous target to search, None searches whole course
         self.animation = False
 
 
@@ -58,23 +164,23 @@ class PurePursuitModel(object):
         return a
 
 
-    def pure_pursuit_control(self, state, cx, cy, pind):
+    def pure_pursuit_control(self, state, course, pind):
 
-        ind = self.calc_target_index(state, cx, cy)
+        ind = self.calc_target_index(state, course, pind)
 
         if pind >= ind:
             # use prev ind if prev ind >= ind
             ind = pind
 
-        if ind < len(cx):
+        if ind < len(course):
             # set tx ty to x,y of current path
-            tx = cx[ind]
-            ty = cy[ind]
+            tx = course.cx[ind]
+            ty = course.cy[ind]
         else:
             # if ind beyond path, go to last point in path
-            tx = cx[-1]
-            ty = cy[-1]
-            ind = len(cx) - 1
+            tx = course.cx[-1]
+            ty = course.cy[-1]
+            ind = len(course) - 1
 
         alpha = math.atan2(ty - state.y, tx - state.x) - state.yaw
 
@@ -86,32 +192,46 @@ class PurePursuitModel(object):
         return delta, ind
 
 
-    def calc_target_index(self, state, cx, cy):
-        dx = [state.x - icx for icx in cx]
-        dy = [state.y - icy for icy in cy]
+    def batch_pure_pursuit_control(self, states, course, pinds, x=None, y=None):
+        """
+        pure_pursuit_control() for a BatchState of K rovers at once.
+        self.Lf and self.Kp may be scalars or length K arrays.
+        x, y are the measured positions to steer from (e.g.,
+        with GPS jitter), defaults to the true states' positions.
+        Returns: delta array, target index array
+        """
+        x = states.x if x is None else x
+        y = states.y if y is None else y
+
+        _, ind = course.tree.query(np.column_stack((x, y)))
+        ind = course.look_ahead_index(ind, self.Lf)
+        ind = np.minimum(np.maximum(ind, pinds), len(course) - 1)  # use prev ind if prev ind >= ind
 
-        d = [abs(math.sqrt(idx ** 2 + idy ** 2)) for (idx, idy) in zip(dx, dy)]
+        alpha = np.arctan2(course.cy[ind] - y, course.cx[ind] - x) - states.yaw
+        alpha = np.where(states.v < 0, math.pi - alpha, alpha)  # backward?
 
-        ind = d.index(min(d))
+        delta = np.arctan2(2.0 * states.L * np.sin(alpha) / self.Lf, 1.0)
 
-        L = 0.0
-        while self.Lf > L and (ind + 1) < len(cx):
-            dx = cx[ind + 1] - cx[ind]
-            dy = cy[ind + 1] - cy[ind]
-            L += math.sqrt(dx ** 2 + dy ** 2)
-            print("Distance b/w points: {}".format(L))
-            ind += 1
+        return delta, ind
 
 
-            # 1. Check to make sure turn angle is >= min turn angle
-            
+    def calc_target_index(self, state, course, pind=None):
+
+        if self.search_window is not None and pind is not None:
+            # only look near the previous target index:
+            ind = course.nearest_in_window(state.x, state.y, pind, self.search_window)
+        else:
+            ind = course.nearest(state.x, state.y)
 
-            # 2. Check to make sure the index change isn't large enough to be deemed
-            # the incorrect path.
+        # first point at least Lf further along the course:
+        ind = course.look_ahead_index(ind, self.Lf)
 
+        # 1. Check to make sure turn angle is >= min turn angle
 
+        # 2. Check to make sure the index change isn't large enough to be deemed
+        # the incorrect path.
 
-        print("Target index: {}".format(ind))
+        logger.debug("Target index: %s", ind)
 
         return ind
 
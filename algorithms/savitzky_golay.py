@@ -1,5 +1,106 @@
 import numpy as np
 import scipy, scipy.signal
+from collections import OrderedDict
+
+# least-squares kernels depend only on the filter parameters, so
+# they're computed once and kept in a small LRU cache:
+COEFFS_CACHE_SIZE = 64
+_coeffs_cache = OrderedDict()
+
+def _cached_coeffs( key, build ):
+    """Returns cached kernel(s) for key, building them with build() on a miss."""
+    try:
+        coeffs = _coeffs_cache.pop( key )
+    except KeyError:
+        coeffs = build()
+        for kernel in ( coeffs if isinstance( coeffs, tuple ) else ( coeffs, ) ):
+            kernel.flags.writeable = False  # shared between callers
+    _coeffs_cache[key] = coeffs  # most recently used last
+    while len( _coeffs_cache ) > COEFFS_CACHE_SIZE:
+        _coeffs_cache.popitem( last = False )
+    return coeffs
+
+def clear_coeffs_cache():
+    """Empties the kernel cache of savitzky_golay_coeffs and sgolay2d_coeffs."""
+    _coeffs_cache.clear()
+
+def savitzky_golay_coeffs( window_size, order, deriv = 0 ):
+    """Savitzky-Golay convolution kernel, cached by ( window_size, order, deriv ).
+    Smoothing with it is np.convolve( kernel, padded_y, mode = 'valid' ),
+    see savitzky_golay. The returned array is read-only.
+    """
+    try:
+        window_size = np.abs( int( window_size ) )
+        order = np.abs( int( order ) )
+    except ValueError:
+        raise ValueError( "window_size and order have to be of type int" )
+    if window_size % 2 != 1 or window_size < 1:
+        raise TypeError( "window_size size must be a positive odd number" )
+    if window_size < order + 2:
+        raise TypeError( "window_size is too small for the polynomials order" )
+
+    def build():
+        order_range = range( order + 1 )
+        half_window = ( window_size - 1 ) // 2
+        b = np.array( [[k ** i for i in order_range] for k in range( -half_window, half_window + 1 )], dtype = np.float64 )
+        return np.linalg.pinv( b )[deriv]
+
+    return _cached_coeffs( ( '1d', window_size, order, deriv ), build )
+
+def sgolay2d_coeffs( window_size, order, derivative = None ):
+    """2-D Savitzky-Golay convolution kernel(s) of sgolay2d, cached by
+    ( window_size, order, derivative ). derivative is None (smoothing),
+    'col', 'row' or 'both', which returns the ( row, col ) kernel pair.
+    Returned arrays are read-only.
+    """
+    # number of terms in the polynomial expression
+    n_terms = ( order + 1 ) * ( order + 2 ) / 2.0
+
+    if  window_size % 2 == 0:
+        raise ValueError( 'window_size must be odd' )
+
+    if window_size ** 2 < n_terms:
+        raise ValueError( 'order is too high for the window size' )
+
+    if derivative not in ( None, 'col', 'row', 'both' ):
+        raise ValueError( "derivative must be None, 'col', 'row' or 'both'" )
+
+    def build_pinv():
+        half_size = window_size // 2
+
+        # exponents of the polynomial.
+        # p(x,y) = a0 + a1*x + a2*y + a3*x^2 + a4*y^2 + a5*x*y + ...
+        # this line gives a list of two item tuple. Each tuple contains
+        # the exponents of the k-th term. First element of tuple is for x
+        # second element for y.
+        # Ex. exps = [(0,0), (1,0), (0,1), (2,0), (1,1), (0,2), ...]
+        exps = [ ( k - n, n ) for k in range( order + 1 ) for n in range( k + 1 ) ]
+
+        # coordinates of points
+        ind = np.arange( -half_size, half_size + 1, dtype = np.float64 )
+        dx = np.repeat( ind, window_size )
+        dy = np.tile( ind, [window_size, 1] ).reshape( window_size ** 2, )
+
+        # build matrix of system of equation
+        A = np.empty( ( window_size ** 2, len( exps ) ) )
+        for i, exp in enumerate( exps ):
+            A[:, i] = ( dx ** exp[0] ) * ( dy ** exp[1] )
+        return np.linalg.pinv( A )
+
+    def build():
+        # one pinv for every derivative type of this window/order:
+        pinv = _cached_coeffs( ( '2d', window_size, order ), build_pinv )
+        if derivative == None:
+            return pinv[0].reshape( ( window_size, -1 ) ).copy()
+        c = -pinv[1].reshape( ( window_size, -1 ) )
+        r = -pinv[2].reshape( ( window_size, -1 ) )
+        if derivative == 'col':
+            return c
+        elif derivative == 'row':
+            return r
+        return ( r, c )
+
+    return _cached_coeffs( ( '2d', window_size, order, derivative ), build )
 
 def savitzky_golay( y, window_size, order, deriv = 0 ):
     r"""Smooth (and optionally differentiate) data with a Savitzky-Golay filter.
@@ -9,8 +110,9 @@ def savitzky_golay( y, window_size, order, deriv = 0 ):
     approaches, such as moving averages techhniques.
     Parameters
     ----------
-    y : array_like, shape (N,)
-        the values of the time history of the signal.
+    y : array_like, shape (N,) or (N, C)
+        the values of the time history of the signal, or of C signals
+        ( e.g., easting, northing, altitude ) smoothed in one call.
     window_size : int
         the length of the window. Must be an odd integer number.
     order : int
@@ -20,7 +122,7 @@ def savitzky_golay( y, window_size, order, deriv = 0 ):
         the order of the derivative to compute (default = 0 means only smoothing)
     Returns
     -------
-    ys : ndarray, shape (N)
+    ys : ndarray, shape (N) or (N, C)
         the smoothed signal (or it's n-th derivative).
     Notes
     -----
@@ -49,80 +151,144 @@ def savitzky_golay( y, window_size, order, deriv = 0 ):
        W.H. Press, S.A. Teukolsky, W.T. Vetterling, B.P. Flannery
        Cambridge University Press ISBN-13: 9780521880688
     """
-    try:
-        window_size = np.abs( np.int( window_size ) )
-        order = np.abs( np.int( order ) )
-    except ValueError, msg:
-        raise ValueError( "window_size and order have to be of type int" )
-    if window_size % 2 != 1 or window_size < 1:
-        raise TypeError( "window_size size must be a positive odd number" )
-    if window_size < order + 2:
-        raise TypeError( "window_size is too small for the polynomials order" )
-    order_range = range( order + 1 )
-    half_window = ( window_size - 1 ) // 2
-    # precompute coefficients
-    b = np.mat( [[k ** i for i in order_range] for k in range( -half_window, half_window + 1 )] )
-    m = np.linalg.pinv( b ).A[deriv]
+    # precomputed ( cached ) coefficients
+    m = savitzky_golay_coeffs( window_size, order, deriv )
+    half_window = ( m.size - 1 ) // 2
     # pad the signal at the extremes with
     # values taken from the signal itself
-    firstvals = y[0] - np.abs( y[1:half_window + 1][::-1] - y[0] )
-    lastvals = y[-1] + np.abs( y[-half_window - 1:-1][::-1] - y[-1] )
-    y = np.concatenate( ( firstvals, y, lastvals ) )
-    return np.convolve( m, y, mode = 'valid' )
+    y = np.asarray( y )
+    y = np.concatenate( ( _firstvals( y, half_window ), y, _lastvals( y, half_window ) ) )
+    return _convolve_valid( m, y )
 
-def savitzky_golay_piecewise( xvals, data, kernel = 11, order = 4 ):
-    turnpoint = 0
-    last = len( xvals )
-    if xvals[1] > xvals[0] : #x is increasing?
-        for i in range( 1, last ) : #yes
-            if xvals[i] < xvals[i - 1] : #search where x starts to fall
-                turnpoint = i
-                break
-    else: #no, x is decreasing
-        for i in range( 1, last ) : #search where it starts to rise
-            if xvals[i] > xvals[i - 1] :
-                turnpoint = i
-                break
-    if turnpoint == 0 : #no change in direction of x
-        return savitzky_golay( data, kernel, order )
-    else:
-        #smooth the first piece
-        firstpart = savitzky_golay( data[0:turnpoint], kernel, order )
-        #recursively smooth the rest
-        rest = savitzky_golay_piecewise( xvals[turnpoint:], data[turnpoint:], kernel, order )
-        return numpy.concatenate( ( firstpart, rest ) )
+def _firstvals( y, half_window ):
+    """Padding before the first sample of y, mirrored about y[0]
+    ( the outermost value repeated if y is shorter than half_window + 1 )."""
+    vals = y[0] - np.abs( y[1:half_window + 1][::-1] - y[0] )
+    edge = vals[:1] if len( vals ) else y[:1]
+    return np.concatenate( ( np.repeat( edge, half_window - len( vals ), axis = 0 ), vals ) )
 
-def sgolay2d ( z, window_size, order, derivative = None ):
+def _lastvals( y, half_window ):
+    """Padding after the last sample of y, mirrored about y[-1]
+    ( the outermost value repeated if y is shorter than half_window + 1 )."""
+    vals = y[-1] + np.abs( y[-half_window - 1:-1][::-1] - y[-1] )
+    edge = vals[-1:] if len( vals ) else y[-1:]
+    return np.concatenate( ( vals, np.repeat( edge, half_window - len( vals ), axis = 0 ) ) )
+
+def _convolve_valid( m, y ):
+    """Convolves kernel m along the first axis of y, for every channel."""
+    if y.ndim == 1:
+        return np.convolve( m, y, mode = 'valid' )
+    return scipy.signal.convolve( y, m.reshape( ( -1, ) + ( 1, ) * ( y.ndim - 1 ) ), mode = 'valid' )
+
+class SavitzkyGolayStream( object ):
+    """Savitzky-Golay filter over a stream of samples, for smoothing tracks
+    as they're read ( e.g., chunks from GPSPlot.iter_chunks ) without
+    holding the whole signal. update() takes chunks of shape (n,) or
+    (n, C) and returns the smoothed samples known so far, half_window
+    samples behind the input; flush() returns the rest at the end of the
+    stream. The outputs put together equal savitzky_golay of the whole
+    signal.
+    Examples
+    --------
+    stream = SavitzkyGolayStream( 31, 4 )
+    for chunk in chunks:
+        smoothed = stream.update( np.column_stack( ( chunk['easting'], chunk['northing'] ) ) )
+    smoothed = stream.flush()
     """
+
+    def __init__( self, window_size, order, deriv = 0 ):
+        self.kernel = savitzky_golay_coeffs( window_size, order, deriv )
+        self.half_window = ( self.kernel.size - 1 ) // 2
+        self._head = None  # first samples, until there are enough to pad the start
+        self._buffer = None  # last window_size - 1 padded samples, once started
+
+    def update( self, y ):
+        """Adds samples y, returns newly smoothed samples."""
+        y = np.asarray( y, dtype = np.float64 )
+        if self._buffer is None:
+            # padding the start needs the first half_window + 1 samples:
+            self._head = y if self._head is None else np.concatenate( ( self._head, y ) )
+            if len( self._head ) < self.half_window + 1:
+                return self._head[:0]
+            y, self._head = self._head, None
+            y = np.concatenate( ( _firstvals( y, self.half_window ), y ) )
+        else:
+            y = np.concatenate( ( self._buffer, y ) )
+            if len( y ) == len( self._buffer ):
+                return y[:0]  # empty chunk
+        self._buffer = y[len( y ) - 2 * self.half_window:]
+        return _convolve_valid( self.kernel, y )
+
+    def flush( self ):
+        """Returns the last half_window smoothed samples."""
+        if self._buffer is None:
+            # stream shorter than half_window + 1 samples, pad both ends of it:
+            y, self._head = self._head, None
+            if y is None or not len( y ):
+                return np.array( [] )
+            y = np.concatenate( ( _firstvals( y, self.half_window ), y, _lastvals( y, self.half_window ) ) )
+        else:
+            # the buffer's last half_window + 1 samples are real ones:
+            y = np.concatenate( ( self._buffer, _lastvals( self._buffer, self.half_window ) ) )
+            self._buffer = None
+        return _convolve_valid( self.kernel, y )
+
+def savitzky_golay_piecewise( xvals, data, kernel = 11, order = 4 ):
+    """Smooths data with savitzky_golay separately between every point
+    where xvals changes direction ( e.g., each pass of a back and forth
+    field log ), so the filter doesn't blur across the turns.
+    data may be (N,) or (N, C). Pieces shorter than kernel // 2 + 1
+    points are returned unsmoothed.
     """
-    # number of terms in the polynomial expression
-    n_terms = ( order + 1 ) * ( order + 2 ) / 2.0
+    data = np.asarray( data )
+    m = savitzky_golay_coeffs( kernel, order )
+    half_window = ( m.size - 1 ) // 2
 
-    if  window_size % 2 == 0:
-        raise ValueError( 'window_size must be odd' )
+    starts = _turnpoints( np.asarray( xvals ) )
+    stops = np.append( starts[1:], len( data ) )
 
-    if window_size ** 2 < n_terms:
-        raise ValueError( 'order is too high for the window size' )
+    smoothed = np.empty( data.shape, dtype = np.float64 )
+    for start, stop in zip( starts, stops ):
+        piece = data[start:stop]
+        if len( piece ) < half_window + 1:
+            smoothed[start:stop] = piece
+            continue
+        piece = np.concatenate( ( _firstvals( piece, half_window ), piece, _lastvals( piece, half_window ) ) )
+        smoothed[start:stop] = _convolve_valid( m, piece )
+    return smoothed
 
-    half_size = window_size // 2
+def _turnpoints( xvals ):
+    """Start indexes of the pieces of xvals that go one way: a piece
+    rising from its first two points ends where x starts to fall, any
+    other piece ends where x starts to rise ( flat steps don't end a
+    piece ). Only the walk from piece to piece is a python loop, the
+    search for each turn is a lookup.
+    """
+    if len( xvals ) < 2:
+        return np.array( [0] )
+    dx = np.diff( xvals )
+    # for every diff, index of the next diff at or after it that falls/rises:
+    positions = np.arange( len( dx ) )
+    no_turn = len( dx )
+    next_fall = np.minimum.accumulate( np.where( dx < 0, positions, no_turn )[::-1] )[::-1]
+    next_rise = np.minimum.accumulate( np.where( dx > 0, positions, no_turn )[::-1] )[::-1]
 
-    # exponents of the polynomial.
-    # p(x,y) = a0 + a1*x + a2*y + a3*x^2 + a4*y^2 + a5*x*y + ...
-    # this line gives a list of two item tuple. Each tuple contains
-    # the exponents of the k-th term. First element of tuple is for x
-    # second element for y.
-    # Ex. exps = [(0,0), (1,0), (0,1), (2,0), (1,1), (0,2), ...]
-    exps = [ ( k - n, n ) for k in range( order + 1 ) for n in range( k + 1 ) ]
+    starts = [0]
+    while starts[-1] < len( dx ):
+        start = starts[-1]
+        turn = next_fall[start] if dx[start] > 0 else next_rise[start]
+        if turn == no_turn:
+            break
+        starts.append( turn + 1 )  # x turns between turn and turn + 1
+    return np.array( starts )
 
-    # coordinates of points
-    ind = np.arange( -half_size, half_size + 1, dtype = np.float64 )
-    dx = np.repeat( ind, window_size )
-    dy = np.tile( ind, [window_size, 1] ).reshape( window_size ** 2, )
+def sgolay2d ( z, window_size, order, derivative = None ):
+    """
+    """
+    # precomputed ( cached ) kernel( s ), also checks parameters
+    kernel = sgolay2d_coeffs( window_size, order, derivative )
 
-    # build matrix of system of equation
-    A = np.empty( ( window_size ** 2, len( exps ) ) )
-    for i, exp in enumerate( exps ):
-        A[:, i] = ( dx ** exp[0] ) * ( dy ** exp[1] )
+    half_size = window_size // 2
 
     # pad input array with appropriate values at the four borders
     new_shape = z.shape[0] + 2 * half_size, z.shape[1] + 2 * half_size
@@ -156,17 +322,8 @@ def sgolay2d ( z, window_size, order, derivative = None ):
     band = Z[-half_size:, half_size].reshape( -1, 1 )
     Z[-half_size:, :half_size] = band - np.abs( np.fliplr( Z[-half_size:, half_size + 1:2 * half_size + 1] ) - band )
 
-    # solve system and convolve
-    if derivative == None:
-        m = np.linalg.pinv( A )[0].reshape( ( window_size, -1 ) )
-        return scipy.signal.fftconvolve( Z, m, mode = 'valid' )
-    elif derivative == 'col':
-        c = np.linalg.pinv( A )[1].reshape( ( window_size, -1 ) )
-        return scipy.signal.fftconvolve( Z, -c, mode = 'valid' )
-    elif derivative == 'row':
-        r = np.linalg.pinv( A )[2].reshape( ( window_size, -1 ) )
-        return scipy.signal.fftconvolve( Z, -r, mode = 'valid' )
-    elif derivative == 'both':
-        c = np.linalg.pinv( A )[1].reshape( ( window_size, -1 ) )
-        r = np.linalg.pinv( A )[2].reshape( ( window_size, -1 ) )
-        return scipy.signal.fftconvolve( Z, -r, mode = 'valid' ), scipy.signal.fftconvolve( Z, -c, mode = 'valid' )
\ No newline at end of file
+    # convolve
+    if derivative == 'both':
+        r, c = kernel
+        return scipy.signal.fftconvolve( Z, r, mode = 'valid' ), scipy.signal.fftconvolve( Z, c, mode = 'valid' )
+    return scipy.signal.fftconvolve( Z, kernel, mode = 'valid' )
\ No newline at end of file
@@ -1,30 +1,18 @@
-import matplotlib.pyplot as plt
+import numpy as np
+import multiprocessing
 import sys
-import csv
+import os
+import glob
 import gmplot
-import utm
+from red_rover_io import load_cached_columns, read_csv_header, LATLON_HEADERS
+from red_rover_bag import is_bag_path, parse_bag_path, load_bag_columns
+from red_rover_utm import utm_to_latlon, zone_from_columns
+from red_rover_simplify import simplify_latlon
+from red_rover_lod import write_lod_geojson
+from collections import OrderedDict
 
 
 
-def find_header_index(headers, data):
-	"""
-	Gets first row (headers) and finds index
-	of user-entered header names.
-	Assuming two headers (e.g., lat, lon)
-	"""
-
-	print("HEADS: {}".format(headers))
-	print("TYPE: {}".format(type(headers)))
-	print("Data Row: {}".format(data[0]))
-
-	_headers_index = []
-
-	for _header in headers:
-		_headers_index.append(data[0].index(_header))
-
-	return _headers_index
-
-
 # def convert_to_float(data_array):
 # 	_float_list = []
 # 	for item in data_array:
@@ -32,91 +20,198 @@ def find_header_index(headers, data):
 # 	return _float_list
 
 
-def build_plot_arrays(headers_index, data_list):
+def open_file(filename, headers=None):
 	"""
-	Takes list of lists input, and returns two arrays
-	for making simple x,y plots.
+	Reads in the file (CSV, or ROS bag as "file.bag[:/topic]")
+	as typed column arrays, only parsing the requested headers (all if None).
 	"""
-	_xarray, _yarray = [], []
-	# list of list -> step through collecting lat/lons:
-	for data_arr in data_list[1:]:
-		_lat = float(data_arr[headers_index[0]])
-		_lon = float(data_arr[headers_index[1]])
-		_xarray.append(_lat)
-		_yarray.append(_lon)
-
-	return _xarray, _yarray
+	if is_bag_path(filename):
+		return load_bag_columns(filename, headers)
+	return load_cached_columns(filename, headers)
 
 
-def open_file(filename):
-	# Read in the file:
-	with open(filename, 'r') as csv_file:
-		reader = csv.reader(csv_file)
-		data_list = list(reader)
-	csv_file.close()
-	return data_list
-
-
-def convert_to_latlon(utm_data):
+def convert_to_latlon(utm_data, zone_number=17, zone_letter="N"):
 	"""
 	Converts UTM to lat/lon values.
-	Input: list of [easting, northing] items
+	Input: dict of 'easting', 'northing' columns, plus optional
+	'zone number' and 'zone letter' columns that override the
+	zone_number/zone_letter fallback.
 	"""
-	zone_number = 17
-	zone_letter = "N"
-	latlon_list = [['latitude', 'longitude']]
+	zone_number, zone_letter = zone_from_columns(utm_data) or (zone_number, zone_letter)
 
-	for xypair in utm_data[1:]:
-		latlon_pair = list(utm.to_latlon(float(xypair[0]), float(xypair[1]), zone_number, zone_letter))  # tuple -> list
-		latlon_list.append(latlon_pair)
+	_lats, _lons = utm_to_latlon(utm_data['easting'], utm_data['northing'], zone_number, zone_letter)
 
-	return latlon_list
+	return {
+		'latitude': _lats,
+		'longitude': _lons
+	}
 
 
-def add_line_data():
+def simplify_track(lats, lons, tolerance=None, method='dp'):
 	"""
-	Adds additional CSV data of lines for testing the pure pursuit
-	algorithm. Initial test are intended to be straight paths behind
-	the engineering annex building.
+	Simplifies a lat/lon track to tolerance metres (see red_rover_simplify),
+	so the map only gets the points that shape it. No-op if tolerance is None.
 	"""
-	line_data = open_file('Data/2018-01-23/pure_pursuit_line_test_1.csv')
-	line_data = convert_to_latlon(line_data)  # returns list of pairs, with first pair being 'latitude' & 'longitude'
-	headers = ['latitude', 'longitude']
-	headers_index = find_header_index(headers, line_data)
-	return build_plot_arrays(headers_index, line_data)
+	if not tolerance:
+		return lats, lons
+	_indexes = simplify_latlon(lats, lons, tolerance, method)
+	print("Simplified {} points to {}".format(len(lats), len(_indexes)))
+	return np.asarray(lats)[_indexes], np.asarray(lons)[_indexes]
 
 
+# session track colors, cycled (matplotlib tab10):
+SESSION_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+					'#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
 
+# position columns looked for in a log, in order (UTM ones are converted):
+POSITION_HEADERS = [('field.latitude', 'field.longitude'), ('latitude', 'longitude'), ('easting', 'northing')]
 
-if __name__ == '__main__':
+LOG_EXTENSIONS = ('.csv', '.bag')
 
-	filename = sys.argv[1]  # input = filename with extension
-	headers = sys.argv[2:]  # assuming remaining args after filename are headers to plot
-	requested_headers = []
-	lat_array, lon_array = [], []  # initializing lists
-	line_lats, line_lons = [], []
-	csv_data = ""
 
-	print("Input File: {}".format(filename))
-	data_list = open_file(filename) # Read in the CSV file
-	headers_index = find_header_index(headers, data_list)  # Find index of xy headers
-	print("headers index: {}".format(headers_index))
 
-	# Break up list of rows in CSV into two arrays for plotting:
-	lat_array, lon_array = build_plot_arrays(headers_index, data_list)
+def find_session_files(sources):
+	"""
+	Expands directories (searched recursively for .csv and .bag logs),
+	globs and file names (or "file.bag:/topic") into a sorted list of logs.
+	"""
+	_files = []
+	for _source in sources:
+		if os.path.isdir(_source):
+			for _root, _dirs, _names in os.walk(_source):
+				_files.extend(os.path.join(_root, _name) for _name in _names
+								if os.path.splitext(_name)[1].lower() in LOG_EXTENSIONS)
+		elif os.path.exists(parse_bag_path(_source)[0]):
+			_files.append(_source)
+		else:
+			_files.extend(glob.glob(_source))
+	return sorted(set(_files))
+
+
+def session_headers(filename):
+	"""
+	Returns the (lat, lon) or (easting, northing) headers
+	of a log, or None if it has no positions.
+	"""
+	if is_bag_path(filename):
+		return LATLON_HEADERS  # bags are read from their NavSatFix topic
+	_headers = read_csv_header(filename)
+	for _xheader, _yheader in POSITION_HEADERS:
+		if _xheader in _headers and _yheader in _headers:
+			return _xheader, _yheader
+	return None
+
 
+def load_session(args):
+	"""
+	Loads a log's track as lat/lon arrays, simplified to tolerance metres.
+	Module level so it can run in a multiprocessing.Pool.
+	Inputs: (filename, headers or None to detect them, tolerance)
+	Returns: (filename, lats, lons), lats/lons None if the log has no positions
+	"""
+	_filename, _headers, _tolerance = args
+	_headers = _headers or session_headers(_filename)
+	if _headers is None:
+		return _filename, None, None
+	try:
+		_data = open_file(_filename, list(_headers))
+	except ValueError:
+		return _filename, None, None  # e.g., bag without a NavSatFix topic
+	if _headers[0] == 'easting':
+		_data = convert_to_latlon(_data)
+		_headers = ('latitude', 'longitude')
+	_lats, _lons = simplify_track(np.array(_data[_headers[0]]), np.array(_data[_headers[1]]), _tolerance)
+	return _filename, _lats, _lons
+
+
+def load_sessions(filenames, headers=None, tolerance=None, processes=None):
+	"""
+	Loads and projects logs in parallel worker processes.
+	Inputs:
+		+ filenames - logs, see find_session_files()
+		+ headers - (lat, lon) or (easting, northing) headers for every
+			log, detected per log if None
+		+ tolerance - simplification tolerance [m], see simplify_track()
+		+ processes - worker processes, defaults to one per cpu, 1 loads in this process
+	Returns: OrderedDict of {filename: (lats, lons, color)} of logs with positions
+	"""
+	_args = [(_filename, headers, tolerance) for _filename in filenames]
+	if processes == 1 or len(_args) < 2:
+		_results = list(map(load_session, _args))
+	else:
+		_pool = multiprocessing.Pool(processes)
+		try:
+			_results = _pool.map(load_session, _args)
+		finally:
+			_pool.close()
+			_pool.join()
+
+	_sessions = OrderedDict()
+	for _filename, _lats, _lons in _results:
+		if _lats is None or not len(_lats):
+			print("Skipping {}, no positions".format(_filename))
+			continue
+		_sessions[_filename] = (_lats, _lons, SESSION_COLORS[len(_sessions) % len(SESSION_COLORS)])
+	return _sessions
+
+
+def draw_sessions_map(sessions, filename, zoom=20, edge_width=2):
+	"""
+	Draws the {name: (lats, lons, color)} tracks of sessions
+	on one gmplot map, centered on them, saved to filename.
+	"""
+	_lats = np.concatenate([_session[0] for _session in sessions.values()])
+	_lons = np.concatenate([_session[1] for _session in sessions.values()])
+	gmap = gmplot.GoogleMapPlotter(np.nanmean(_lats), np.nanmean(_lons), zoom)
+	for _name, (_lats, _lons, _color) in sessions.items():
+		print("{}: {} ({} points)".format(_color, _name, len(_lats)))
+		gmap.plot(_lats, _lons, _color, edge_width=edge_width)
+	gmap.draw(filename)
+	return filename
 
-	# Trying to add line GPS data as well to make sure it's not overlapping anything:
-	line_lats, line_lons = add_line_data()
-	# print("line lats: {}".format(line_lats))
-	# print("line lons: {}".format(line_lons))
 
 
-	# gmplot library stuff:
-	gmap = gmplot.GoogleMapPlotter(31.4736, -83.5299, 20)  # initial start pos and zoom level
 
-	gmap.plot(lat_array, lon_array, 'cornflowerblue', edge_width=2)  # build plot
-	gmap.plot(line_lats, line_lons, 'red', edge_width=3)
+if __name__ == '__main__':
 
-	# gmap.draw("{}.html".format(sys.argv[1]))  # save as html
-	gmap.draw("Data/2018-01-23/turn_test_with_lines_1.html")
\ No newline at end of file
+	# e.g., python gmap_plots.py Data/ --out=all_sessions.html
+	#       python gmap_plots.py "Data/2017-10-04/*_fix.csv" Data/2018-01-23 --headers=easting,northing
+	sources = []  # logs, dirs or globs
+	headers = None  # --headers=lat,lon (or easting,northing) for every log, detected per log if not given
+	tolerance = None  # --tolerance=0.1 simplifies tracks to 0.1m
+	lod_dir = None  # --lod=out_dir writes level-of-detail GeoJSON instead of the gmplot html
+	out_file = "sessions_map.html"  # --out=map.html
+	processes = None  # --processes=4, defaults to one per cpu
+	for _arg in sys.argv[1:]:
+		if _arg.startswith('--tolerance='):
+			tolerance = float(_arg.split('=', 1)[1])
+		elif _arg.startswith('--lod='):
+			lod_dir = _arg.split('=', 1)[1]
+		elif _arg.startswith('--out='):
+			out_file = _arg.split('=', 1)[1]
+		elif _arg.startswith('--processes='):
+			processes = int(_arg.split('=', 1)[1])
+		elif _arg.startswith('--headers='):
+			headers = tuple(_arg.split('=', 1)[1].split(','))
+			if len(headers) != 2:
+				sys.exit("--headers needs two comma separated columns, e.g. --headers=field.latitude,field.longitude")
+		elif _arg.startswith('--'):
+			sys.exit("unknown option: {}".format(_arg))
+		elif os.path.exists(parse_bag_path(_arg)[0]) or glob.glob(_arg):
+			sources.append(_arg)
+		else:
+			sys.exit("{} doesn't match any file".format(_arg))
+
+	filenames = find_session_files(sources)
+	print("Input Files: {}".format(filenames))
+	sessions = load_sessions(filenames, headers, tolerance, processes)
+	if not sessions:
+		sys.exit("No positions found in {}".format(sources))
+
+	if lod_dir:
+		# levels for google_map_dragdrop_geojson.html (?lod=out_dir/sessions.lod.json):
+		_index_file = write_lod_geojson(lod_dir, sessions, 'sessions')
+		print("Wrote level-of-detail index: {}".format(_index_file))
+	else:
+		draw_sessions_map(sessions, out_file)
+		print("Wrote map: {}".format(out_file))
@@ -7,12 +7,80 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as md
 from algorithms import detect_peaks
+from red_rover_io import load_csv_columns, load_cached_columns, write_csv_columns, read_csv_header, iter_csv_chunks, add_utm_columns
+from red_rover_utm import latlon_to_utm, utm_to_latlon, zone_from_columns
+from red_rover_bag import BagReader, is_bag_path, parse_bag_path, default_topic, load_bag_columns
+from red_rover_gpx import write_gpx
+from red_rover_simplify import simplify_indexes
+from collections import OrderedDict
 import datetime
+import logging
 import time
 import sys
 import csv
 import utm
 import json
+import os
+
+
+
+class TimeIndex(object):
+	"""
+	Binary search index over a log's monotonic time column
+	(e.g., %time nanosecond stamps), built once per loaded log.
+	Answers "rows between t0 and t1" in O(log n) and returns
+	zero-copy slices of the log's columns. Unsorted columns
+	fall back to a linear search in nearest(), and raise
+	ValueError for time windows.
+	"""
+
+	def __init__(self, csv_data, time_header='%time'):
+		self.csv_data = csv_data  # dict of {header: np.ndarray}
+		self.time_header = time_header
+		self.times = np.asanyarray(csv_data[time_header])
+		self.monotonic = len(self.times) < 2 or bool(np.all(self.times[1:] >= self.times[:-1]))
+
+	def is_for(self, csv_data, time_header):
+		"""
+		True if index was built for this time column.
+		"""
+		return time_header == self.time_header and csv_data.get(time_header) is self.times
+
+	def _as_time(self, t):
+		# query in the column's own dtype, so searchsorted doesn't convert the column:
+		return self.times.dtype.type(t)
+
+	def row_range(self, t0, t1):
+		"""
+		Returns (start, stop) rows with t0 <= time <= t1.
+		"""
+		if not self.monotonic:
+			raise ValueError("{} column isn't monotonic".format(self.time_header))
+		_start = int(np.searchsorted(self.times, self._as_time(t0), side='left'))
+		_stop = int(np.searchsorted(self.times, self._as_time(t1), side='right'))
+		return _start, max(_start, _stop)
+
+	def nearest(self, t):
+		"""
+		Returns index of the first row with time closest to t.
+		"""
+		if not self.monotonic:
+			return int(np.argmin(np.abs(self.times.astype(np.float64) - float(t))))
+		_i = int(np.searchsorted(self.times, self._as_time(t), side='left'))
+		if _i >= len(self.times):
+			_i = len(self.times) - 1
+		elif _i > 0 and abs(float(t) - float(self.times[_i - 1])) <= abs(float(self.times[_i]) - float(t)):
+			_i -= 1
+		return int(np.searchsorted(self.times, self.times[_i], side='left'))  # first of any repeated times
+
+	def window(self, t0, t1, headers=None):
+		"""
+		Returns {header: array view} of rows with t0 <= time <= t1,
+		for headers (all columns if None).
+		"""
+		_start, _stop = self.row_range(t0, t1)
+		headers = headers or list(self.csv_data.keys())
+		return OrderedDict((_header, self.csv_data[_header][_start:_stop]) for _header in headers)
 
 
 
@@ -28,11 +96,12 @@ class GPSPlot(object):
 			'alt': 'field.altitude'
 		}
 		self.filename = ''  # csv file with gps data
-		self.csv_data = []  # list of lists, csv data
+		self.csv_data = {}  # dict of {header: np.ndarray}, csv data columns
 		self.xheader = ''  # column name of data for x axis
 		self.yheader = ''  # column name of data for y axis
 		self.x_array = []  # x axis data for plot
 		self.y_array = []  # y axis data for plot
+		self.time_index = None  # TimeIndex of csv_data's time column
 
 
 
@@ -42,16 +111,16 @@ class GPSPlot(object):
 	#########################
 	"""
 
-	def find_header_index(self, csv_data, header):
+	def get_column(self, csv_data, header):
 		"""
-		Returns index of header from CSV data,
-		assumes row one of csv_data are headers.
+		Returns column array of header from CSV data,
+		where csv_data is a dict of {header: np.ndarray}.
 		"""
 		print("Searching for {} in csv data".format(header))
-		print("Looking in headers: {}".format(csv_data[0]))
+		print("Looking in headers: {}".format(list(csv_data.keys())))
 		try:
-			return csv_data[0].index(header)
-		except ValueError as e:
+			return csv_data[header]
+		except KeyError as e:
 			logging.warning("header: {} not in csv data..".format(header))
 		except Exception as e:
 			raise e
@@ -63,12 +132,10 @@ class GPSPlot(object):
 		Essentially the input CSV w/ additional UTM data.
 		Inputs:
 			+ fileout - filename for output file
+			+ fileout_data - dict of {header: np.ndarray} columns
 			+ path - TODO...
 		"""
-		with open(fileout_name, 'w') as csv_file:
-			writer = csv.writer(csv_file)
-			writer.writerows(fileout_data)
-		csv_file.close()
+		write_csv_columns(fileout_name, fileout_data)
 		# logging.info("file: {} created...".format(fileout))
 		return
 
@@ -105,11 +172,23 @@ class GPSPlot(object):
 	def findNearest(self, data_array, val):
 		"""
 		Returns index of value from data_array
-		closest to val
+		closest to val, binary searched if data_array
+		is sorted (e.g., a log's time column).
 		"""
-		nearest_val = min(data_array, key=lambda x:abs(x-val))
-		print("nearest val in data array: {}".format(nearest_val))
-		return data_array.index(nearest_val)
+		if self.time_index is None or self.time_index.times is not data_array:
+			self.get_time_index({'time': data_array}, 'time')
+		nearest_index = self.time_index.nearest(val)
+		print("nearest val in data array: {}".format(data_array[nearest_index]))
+		return nearest_index
+
+	def get_time_index(self, csv_data, time_header):
+		"""
+		Returns TimeIndex over csv_data's time_header column,
+		only building a new one when the data changes.
+		"""
+		if self.time_index is None or not self.time_index.is_for(csv_data, time_header):
+			self.time_index = TimeIndex(csv_data, time_header)
+		return self.time_index
 
 	def convertDegreeLatLonToDecimalLatLon(self, data_list):
 		_dec_lat_lons = []
@@ -126,70 +205,83 @@ class GPSPlot(object):
 	################################
 	"""
 
-	def upload_csv(self, filename):
-		_csv_data = []
-		# Read in the file:
-		with open(filename, 'r') as _csv_file:
-			reader = csv.reader(_csv_file)
-			_csv_data = list(reader)
-		_csv_file.close()
-		return _csv_data
+	def upload_csv(self, filename, headers=None, row_step=1):
+		"""
+		Reads CSV into typed column arrays (all columns if headers
+		is None), memory-mapped from the CSV's column cache after
+		the first load. Also reads ROS bags directly ("file.bag"
+		or "file.bag:/topic"), with the same column names as exported CSVs.
+		Returns: dict of {header: np.ndarray}
+		"""
+		if is_bag_path(filename):
+			return load_bag_columns(filename, headers, row_step=row_step)
+		return load_cached_columns(filename, headers, row_step=row_step)
+
+	def iter_chunks(self, filename, headers=None, chunk_rows=4096):
+		"""
+		Streams a CSV or ROS bag ("file.bag" or "file.bag:/topic")
+		as dicts of up to chunk_rows rows of typed column arrays,
+		without loading the whole log.
+		"""
+		if is_bag_path(filename):
+			_path, _topic = parse_bag_path(filename)
+			reader = BagReader(_path)
+			return reader.iter_column_chunks(_topic or default_topic(reader), headers, chunk_rows)
+		return iter_csv_chunks(filename, headers, chunk_rows=chunk_rows)
 
 	def add_utm_to_csvdata(self, csv_data):
 		"""
 		Adds UTM data to input CSV, assumes
 		headers for lat/lons are in ros format.
-		Returns: modified csv data as list of lists (rows)
+		Returns: modified csv data as dict of {header: np.ndarray}
 		"""
-		_headers_list = csv_data[0]
-		_headers_list = _headers_list + self.utm_keys
-
-		_mod_data_list = []
-		_mod_data_list.append(_headers_list)
+		_mod_data = OrderedDict(csv_data)
 
 		# find lat/lon columns..
-		_lat_index = self.find_header_index(csv_data, self.ros_gps_headers['lat'])  # finds header indexes for self.x/yheader
-		_lon_index = self.find_header_index(csv_data, self.ros_gps_headers['lon'])
+		_lats = self.get_column(csv_data, self.ros_gps_headers['lat'])
+		_lons = self.get_column(csv_data, self.ros_gps_headers['lon'])
 
-		for _data_row in csv_data[1:]:
-			_temp_row = _data_row
-			_lat = float(_temp_row[_lat_index])  # convert to float
-			_lon = float(_temp_row[_lon_index])  # convert to float 
-			_utm_tuple = self.convert_latlon_to_utm(_lat, _lon)  # get utm from lat/lon
-			_temp_row = _temp_row + list(_utm_tuple)  # add utm data to row
-			_mod_data_list.append(_temp_row)
+		# get utm from lat/lon, whole columns at once (zone detected from data):
+		_eastings, _northings, _zone_number, _zone_letter = latlon_to_utm(_lats, _lons)
 
-		return _mod_data_list
+		# add utm data as columns:
+		_mod_data[self.utm_keys[0]] = _eastings
+		_mod_data[self.utm_keys[1]] = _northings
+		_mod_data[self.utm_keys[2]] = np.full(len(_eastings), _zone_number, dtype=np.int64)
+		_mod_data[self.utm_keys[3]] = np.repeat(np.array(_zone_letter), len(_eastings))
 
-	def plotxy(self, csv_data, xheader, yheader):
+		return _mod_data
+
+	def plotxy(self, csv_data, xheader, yheader, axrange=None):
 		"""
-		Plot xheader vs yheader csv col data w/ pyplot
+		Plot xheader vs yheader csv col data w/ pyplot.
+		If axrange [xmin, xmax, ..] is given and xheader is
+		monotonic (e.g., time), only rows in the x range are returned.
 		"""
 
 		# print("CSV Data: {}".format(csv_data))
 		print("Finding {} and {} in csv data..".format(xheader, yheader))
 
 		# find cols from csv data:
-		_x_index = self.find_header_index(csv_data, xheader)
-		_y_index = self.find_header_index(csv_data, yheader)
-		_x_array = []
-		_y_array = []
 		_plot_data = {
-			'xarray': [],
-			'yarray': [],
+			'xarray': self.get_column(csv_data, xheader),
+			'yarray': self.get_column(csv_data, yheader),
 			'properties': None  # TODO..
 		}
 
-		# build x and y array for plotting:
-		for _data_row in csv_data[1:]:
+		if axrange:
+			try:
+				_window = self.get_time_index(csv_data, xheader).window(
+								float(axrange[0]), float(axrange[1]), [xheader, yheader])
+			except ValueError:
+				pass  # x not monotonic, plot limits do the trimming
+			else:
+				_plot_data['xarray'] = _window[xheader]
+				_plot_data['yarray'] = _window[yheader]
 
-			# if 'time' in xheader:
-			# 	_ut = float(_data_row[_x_index])  # ros ut format --> 1.50714738486656e+18
-			# 	_ut = _ut / pow(10,9)  # format to proper magnitude
-			# 	_plot_data['xarray'].append(self.convertUnixTime(_ut))
-			# else:
-			_plot_data['xarray'].append(float(_data_row[_x_index]))
-			_plot_data['yarray'].append(float(_data_row[_y_index]))
+		# if 'time' in xheader:
+		# 	_ut = _plot_data['xarray'] / pow(10,9)  # ros ut format --> 1.50714738486656e+18
+		# 	_plot_data['xarray'] = [self.convertUnixTime(_t) for _t in _ut]
 
 		return _plot_data
 
@@ -197,36 +289,24 @@ class GPSPlot(object):
 		"""
 		Finds peaks of data, returns list
 		"""
-		_x_index = self.find_header_index(csv_data, xheader)
-		_y_index = self.find_header_index(csv_data, yheader)
-		_x_array = []
-		_y_array = []
-
-		for _data_row in csv_data[1:]:
-			# build x/y arrays for findings peaks:
-			_x_array.append(float(_data_row[_x_index]))
-			_y_array.append(float(_data_row[_y_index]))
+		# x/y arrays for findings peaks:
+		_x_array = self.get_column(csv_data, xheader)
+		_y_array = self.get_column(csv_data, yheader)
 
 		print("min range: {}, max range: {}".format(axrange[0], axrange[1]))
-		print(type(axrange[0]))
-
-		ind = axrange[0].index("e")
-		min_index_key = float(axrange[0][0:ind-1])  # trim off "e+18" (assuming unix time)
-		ind = axrange[1].index("e")
-		max_index_key = float(axrange[1][0:ind-1])
 
-
-		# get peaks for requested range:
+		# get peaks for requested range (binary search of x, e.g., unix time):
 		try:
-			_min_index = self.findNearest(_x_array, float(axrange[0]))
-			_max_index = self.findNearest(_x_array, float(axrange[1]))
+			_time_index = self.get_time_index(csv_data, xheader)
+			_min_index = _time_index.nearest(float(axrange[0]))
+			_max_index = _time_index.nearest(float(axrange[1]))
 		except Exception as e:
-			print("exception getting min/max from data: {}, {}".format(axrange[0], range[1]))
+			print("exception getting min/max from data: {}, {}".format(axrange[0], axrange[1]))
 			raise e
 
 		print("min/max index range for finding peaks: {}/{}".format(_min_index, _max_index))
 
-		_y_array = _y_array[_min_index:_max_index]
+		_y_array = _y_array[_min_index:_max_index]  # zero-copy views of window
 		_x_array = _x_array[_min_index:_max_index]
 
 		_peak_indexes = detect_peaks.detect_peaks(_y_array, valley=False)  # no filter
@@ -256,6 +336,141 @@ class GPSPlot(object):
 
 		return _plot_data
 
+	def simplify_track(self, csv_data, tolerance, method='dp', xheader='easting', yheader='northing'):
+		"""
+		Drops rows that don't change the shape of the xheader/yheader
+		(UTM, metres) track by more than tolerance metres, e.g. before
+		plotting a long log. method - 'dp' (Douglas-Peucker) or 'vw' (Visvalingam).
+		Returns: dict of {header: np.ndarray} of the kept rows
+		"""
+		_indexes = simplify_indexes(self.get_column(csv_data, xheader), self.get_column(csv_data, yheader), tolerance, method)
+		return OrderedDict((_header, np.asarray(_column)[_indexes]) for _header, _column in csv_data.items())
+
+	def segment_turns(self, csv_data, time_header='%time', min_rate=0.05, min_speed=0.1,
+						min_duration=10.0, smooth=25, time_scale=1e-9):
+		"""
+		Auto-segments a log into left/right turn windows from the
+		heading rate of its easting/northing track.
+		Inputs:
+			+ min_rate - min heading rate to count as turning [rad/s]
+			+ min_speed - slower samples (GPS jitter) count as not turning [m/s]
+			+ min_duration - shortest turn segment kept [s]
+			+ smooth - moving average length for heading rate, in samples
+			+ time_scale - seconds per time unit (ROS %time is ns)
+		Returns: list of (t0, t1, 'left' or 'right') windows
+		"""
+		_t = np.asarray(csv_data[time_header], dtype=np.float64) * time_scale
+		_de = np.diff(csv_data['easting'])
+		_dn = np.diff(csv_data['northing'])
+		_dt = np.maximum(np.diff(_t), 1e-6)
+
+		_heading = np.unwrap(np.arctan2(_dn, _de))
+		_rate = np.concatenate(([0.0], np.diff(_heading))) / _dt
+		_speed = np.hypot(_de, _dn) / _dt
+		smooth = max(1, min(smooth, len(_rate)))  # convolve 'same' output is as long as the longer input
+		_kernel = np.ones(smooth) / float(smooth)
+		_rate = np.convolve(_rate, _kernel, mode='same')
+		_speed = np.convolve(_speed, _kernel, mode='same')
+
+		# +1 left (ccw), -1 right (cw), 0 straight or stopped, per sample step:
+		_direction = np.where(np.abs(_rate) > min_rate, np.sign(_rate), 0) * (_speed > min_speed)
+		_changes = np.flatnonzero(np.diff(_direction)) + 1
+		_starts = np.concatenate(([0], _changes))
+		_stops = np.concatenate((_changes, [len(_direction)]))
+
+		_times = csv_data[time_header]
+		_windows = []
+		for _start, _stop in zip(_starts, _stops):
+			if _direction[_start] == 0 or _t[_stop] - _t[_start] < min_duration:
+				continue
+			_windows.append((_times[_start], _times[_stop], 'left' if _direction[_start] > 0 else 'right'))
+		return _windows
+
+	def find_peaks_batch(self, csv_data, xheader, yheader, windows=None, **detect_kwargs):
+		"""
+		Finds peaks and valleys of yheader vs xheader for many
+		x (e.g., time) windows in one pass: detect_peaks runs once
+		for peaks and once for valleys over the whole log, then each
+		window takes the ones strictly inside it (like find_peaks()
+		running on the window alone, with mpd applied log-wide).
+		Inputs:
+			+ windows - list of (x0, x1) or (x0, x1, label),
+				auto-segmented with segment_turns() if None
+			+ detect_kwargs - extra detect_peaks options (mph, threshold, ..)
+		Returns: list of dicts per window with x/y minimas and maximas,
+			'amplitude' (mean peak - mean valley), 'radius' (amplitude / 2,
+			turn radius when y is easting or northing of a circling rover)
+			and 'period' (mean x between peaks).
+		"""
+		if windows is None:
+			windows = self.segment_turns(csv_data, xheader)
+
+		_x_array = self.get_column(csv_data, xheader)
+		_y_array = self.get_column(csv_data, yheader)
+		_time_index = self.get_time_index(csv_data, xheader)
+
+		_peak_indexes = detect_peaks.detect_peaks(_y_array, valley=False, **detect_kwargs)
+		_valley_indexes = detect_peaks.detect_peaks(_y_array, valley=True, **detect_kwargs)
+
+		_results = []
+		for _window in windows:
+			_start, _stop = _time_index.row_range(_window[0], _window[1])
+
+			# first and last values of a window cannot be peaks:
+			_peaks = _peak_indexes[np.searchsorted(_peak_indexes, _start, side='right'):
+									np.searchsorted(_peak_indexes, _stop - 1, side='left')]
+			_valleys = _valley_indexes[np.searchsorted(_valley_indexes, _start, side='right'):
+										np.searchsorted(_valley_indexes, _stop - 1, side='left')]
+
+			_amplitude = None
+			if _peaks.size and _valleys.size:
+				_amplitude = float(np.mean(_y_array[_peaks]) - np.mean(_y_array[_valleys]))
+
+			_results.append({
+				'window': _window,
+				'xarray': _x_array[_start:_stop],
+				'yarray': _y_array[_start:_stop],
+				'xmaximas': _x_array[_peaks],
+				'ymaximas': _y_array[_peaks],
+				'xminimas': _x_array[_valleys],
+				'yminimas': _y_array[_valleys],
+				'amplitude': _amplitude,
+				'radius': _amplitude / 2.0 if _amplitude is not None else None,
+				'period': float(np.mean(np.diff(_x_array[_peaks]))) if _peaks.size > 1 else None
+			})
+
+		return _results
+
+
+
+	def stream_peaks(self, column_chunks, xheader, yheader, **detect_kwargs):
+		"""
+		Detects peaks and valleys of yheader vs xheader in a stream
+		of column chunks (e.g., from iter_chunks()), yielding each one
+		as soon as it's final, for watching a live or unbounded log.
+		Inputs:
+			+ column_chunks - iterable of {header: np.ndarray} chunks
+			+ detect_kwargs - detect_peaks options (mph, mpd, threshold, edge, kpsh)
+		Yields: ('peak' or 'valley', x, y), in the order they're confirmed
+		"""
+		_detectors = [
+			('peak', detect_peaks.StreamingPeakDetector(valley=False, **detect_kwargs)),
+			('valley', detect_peaks.StreamingPeakDetector(valley=True, **detect_kwargs))
+		]
+
+		for _chunk in column_chunks:
+			_found = []
+			for _kind, _detector in _detectors:
+				_found.extend((_index, _kind, _x, _y) for _index, _x, _y in _detector.update(_chunk[yheader], _chunk[xheader]))
+			for _index, _kind, _x, _y in sorted(_found):
+				yield _kind, _x, _y
+
+		_found = []
+		for _kind, _detector in _detectors:
+			_found.extend((_index, _kind, _x, _y) for _index, _x, _y in _detector.flush())
+		for _index, _kind, _x, _y in sorted(_found):
+			yield _kind, _x, _y
+
 
 
 class GPSDataHandler(GPSPlot):
@@ -267,53 +482,27 @@ class GPSDataHandler(GPSPlot):
 		self.input_file = input_file  # input csv filename
 		self.output_file = output_file  # output gpx filename
 
-		# Template for gpx output file:
-		self.gpx_template = """
-		<?xml version="1.0" encoding="UTF-8" standalone="no"?>
-		<gpx
-		   version="1.1"
-		   creator=""
-		   xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
-		   xmlns="http://www.topografix.com/GPX/1/1"
-		   xsi:schemaLocation="http://www.topografix.com/GPX/1/1/gpx.xsd">
-		<metadata>
-		<name> peanut_field_latlon_only.gpx </name>
-		   <copyright author="">
-		      <year>2018</year>
-		   </copyright>
-		</metadata>
-			<rte>{}</rte>
-		</gpx>
-		"""
-		self.gpx_point = '<rtept lat="{}" lon="{}"></rtept>'  # lat/lon template for gpx point
-
-	def create_gpx_from_csv(self, row_skip=2):
-		"""
-		Reads in CSV of lat/lons,
-		then wraps gpx tags around it,
-		finally saves it as a gpx file.
-		"""
-		# 1. Read in CSV file (returns list of lists, where lists are rows):
-		csv_data = self.upload_csv(self.input_file)
-
-		# 2. Fill in gpx template with lat/lons from CSV:
-		gpx_points = ""
-		# for row in csv_data:
-		for i in range(0, len(csv_data) - 1, row_skip):
-			_row = csv_data[i]
-			gpx_points += self.gpx_point.format(_row[0], _row[1])  # building string of gpx points
-		
-		# gpx_content = self.gpx_template.replace(" ", "").replace("\n", "").replace("\t", "")  # get instance of gpx template
-		# gpx_content.format(gpx_points)  # insert points into gpx template
-		gpx_content = self.gpx_template.format(gpx_points).replace("\n", "").replace("\t", "")  # get instance of gpx template
-
-		# 3. Output gpx content to output file:
-		print("Creating the following template: {}, with output file name: {}".format(gpx_content, self.output_file))
-		# self.create_csv(self.output_file, gpx_content)
-		self.create_output_file(self.output_file, gpx_content)
-		print("File created!")
+	def create_gpx_from_csv(self, row_skip=2, min_interval=None, min_distance=None, element='rtept',
+							lat_header=0, lon_header=1, time_header=None, tolerance=None):
+		"""
+		Streams a CSV of lat/lons into a gpx file, a chunk of
+		rows at a time, keeping every row_skip'th row and optionally
+		one point per min_interval (ns, needs time_header) or per
+		min_distance metres travelled, simplified to tolerance metres.
+		Headers default to lat, lon columns 0, 1 of a headerless CSV.
+		Returns: number of gpx points written
+		"""
+		_headers = [lat_header, lon_header] + ([time_header] if time_header is not None else [])
+		_has_header_row = not all(isinstance(_header, int) for _header in _headers)
+		_chunks = iter_csv_chunks(self.input_file, _headers, header=_has_header_row)
 
-		return
+		print("Creating gpx file: {}".format(self.output_file))
+		_count = write_gpx(self.output_file, _chunks, lat_header, lon_header, time_header, element,
+							row_skip, min_interval, min_distance, name=os.path.basename(self.output_file),
+							tolerance=tolerance)
+		print("File created with {} points!".format(_count))
+
+		return _count
 
 
 def main_gpx(input_file):
@@ -347,32 +536,34 @@ def main():
 		+ utm_csv - converts lat/lons to utm, adds utm data to input csv and saves to disk.
 		+ analyze_turn_tests - for turn tests; gets peaks and troughs in time window,
 			average min/maxes, other stats (probably).
+		+ findpeaks_batch - peaks/troughs, amplitude and turn radius for every
+			time window given as [x0 x1 x0 x1 ..] (auto-segments turns if none).
+		+ streampeaks - prints peaks/troughs as they're confirmed while streaming
+			through the file, with an optional [mpd].
 		+ gmap_plot - plot lat/lons on a google maps page.
+	[filename] can also be a ROS bag, read directly: file.bag (first NavSatFix topic)
+	or file.bag:/topic (e.g., Data/2017-09-20/gps_field_test_1.bag:/vel).
 	"""
 	if sys.argv[2] == "to_dec":
-		gps = GPSPlot()
-		data = gps.upload_csv(sys.argv[1])
 		easting_index = 8
 		northing_index = 9
-		zone_number = 17
+		zone_number = 17  # fallback if CSV has no zone columns
 		zone_letter = "N"
 
-		_declatlon_list = []  # format: list(list[lat, lon])
-		for item in data[1:]:
-			_latlon = []
-			_easting = item[easting_index].split('(')[0]
-			print("easting: {}".format(_easting))
-			_northing = item[northing_index]
-			print("northing: {}".format(_northing))
-			_latlondec = utm.to_latlon(float(_easting), float(_northing), zone_number, zone_letter)
-			_declatlon_list.append([_latlondec[0], _latlondec[1]])  # list of list items of lat,lon in dec
+		# use zone columns from add_utm_to_csvdata() output, if there are any:
+		_zone_headers = [_header for _header in ('zone number', 'zone letter') if _header in read_csv_header(sys.argv[1])]
+
+		data = load_csv_columns(sys.argv[1], [easting_index, northing_index] + _zone_headers,
+								dtypes={easting_index: str, northing_index: np.float64, 'zone letter': str})
+		_eastings = np.char.partition(data[easting_index], '(')[:, 0].astype(np.float64)
+		zone_number, zone_letter = zone_from_columns(data) or (zone_number, zone_letter)
+
+		print("converting {} eastings/northings in zone {}{}".format(len(_eastings), zone_number, zone_letter))
+		_lats, _lons = utm_to_latlon(_eastings, data[northing_index], zone_number, zone_letter)
 
 		print("creating a file for updated data!")
 
-		fileout = open('lat_lon_decimals.csv', 'w')
-		for item in _declatlon_list:
-			fileout.write("{}, {}\n".format(item[0], item[1]))
-		fileout.close()
+		np.savetxt('lat_lon_decimals.csv', np.column_stack((_lats, _lons)), fmt='%.10f', delimiter=', ')
 
 	else:
 
@@ -382,8 +573,22 @@ def main():
 		gps_plot.xheader = sys.argv[2]
 		gps_plot.yheader = sys.argv[3]
 
-		_csv_data = gps_plot.upload_csv(gps_plot.filename)  # upload csv data of filename
 		_func = sys.argv[4]
+		_headers = [gps_plot.xheader, gps_plot.yheader]
+		if _func == 'utm_csv':
+			_headers = None  # utm_csv writes out every column
+		elif _func == 'findpeaks_batch' and len(sys.argv) <= 5:
+			_headers = None  # turn segmenting needs the log's track (easting/northing, or lat/lon)
+
+		if _func == 'streampeaks':
+			# peaks as they come in, without loading the whole file:
+			_mpd = int(sys.argv[5]) if len(sys.argv) > 5 else 1
+			_chunks = gps_plot.iter_chunks(gps_plot.filename, _headers)
+			for _kind, _x, _y in gps_plot.stream_peaks(_chunks, gps_plot.xheader, gps_plot.yheader, mpd=_mpd):
+				print("{}: {}, {}".format(_kind, _x, _y))
+			return
+
+		_csv_data = gps_plot.upload_csv(gps_plot.filename, _headers)  # upload csv data of filename
 
 		# _axes_range = [None, None, None, None]  # [xmin, xmax, ymin, ymax]
 		_axes_range = []
@@ -391,10 +596,7 @@ def main():
 		# check for provided range (todo: handle Nones):
 		if len(sys.argv) > 5:
 			# assuming x/y min/max ranges are set..
-			_axes_range.append(sys.argv[5])
-			_axes_range.append(sys.argv[6])
-			_axes_range.append(sys.argv[7])
-			_axes_range.append(sys.argv[8])
+			_axes_range.extend(sys.argv[5:9])
 			print("Axes range: {}".format(_axes_range))
 
 
@@ -403,7 +605,7 @@ def main():
 
 		if _func == 'utm_csv':
 			_csv_data = gps_plot.add_utm_to_csvdata(_csv_data)
-			_fileout_name = "{}_utm.csv".format(self.filename.split(".")[0])  # filename --> inputfile + "_utm.cscv"
+			_fileout_name = "{}_utm.csv".format(gps_plot.filename.split(".")[0])  # filename --> inputfile + "_utm.cscv"
 			gps_plot.create_csv(_fileout_name, _csv_data)
 			print ("file: {} created..".format(_fileout_name))
 
@@ -420,7 +622,7 @@ def main():
 				plt.ylim(float(_axes_range[2]), float(_axes_range[3]))
 				print("set y range from {} to {}".format(_axes_range[2], _axes_range[3]))
 
-			_plot_data = gps_plot.plotxy(_csv_data, gps_plot.xheader, gps_plot.yheader)  # plot obj.x/yheader
+			_plot_data = gps_plot.plotxy(_csv_data, gps_plot.xheader, gps_plot.yheader, _axes_range)  # plot obj.x/yheader
 			print("plot data parsed, now making plot..")
 
 			plt.plot(_plot_data['xarray'], _plot_data['yarray'])  # other options, titles, ranges???
@@ -435,7 +637,7 @@ def main():
 			# Inserting temporary code segment for adding lines to turn tests data.			#
 			# This is to help determine some good lines to test the pure pursuit algorithm.	#
 			#################################################################################
-			_csv_data = gps_plot.upload_csv('Data/2018-01-23/pure_pursuit_line_test_1.csv')  # upload csv data of filename
+			_csv_data = gps_plot.upload_csv('Data/2018-01-23/pure_pursuit_line_test_1.csv', ['easting', 'northing'])  # upload csv data of filename
 			_plot_data = gps_plot.plotxy(_csv_data, 'easting', 'northing')
 			plt.plot(_plot_data['xarray'], _plot_data['yarray'], 'go')  # plot line as green dots
 
@@ -474,6 +676,37 @@ def main():
 			plt.title("Turn Tests 10-04-2017 (5min Single Avg)")
 			plt.show()  # display plot!
 
+		elif _func == 'findpeaks_batch':
+			# peaks for many windows of one log in one pass:
+			_windows = None
+			if len(sys.argv) > 5:
+				_bounds = [float(_bound) for _bound in sys.argv[5:]]
+				_windows = list(zip(_bounds[0::2], _bounds[1::2]))
+			else:
+				_csv_data = add_utm_columns(OrderedDict(_csv_data))  # e.g., bags only have lat/lons
+				if 'easting' not in _csv_data or 'northing' not in _csv_data:
+					sys.exit("{} has no easting/northing or lat/lon track to segment turns from, "
+								"give time windows instead: [x0 x1 x0 x1 ..]".format(gps_plot.filename))
+
+			_results = gps_plot.find_peaks_batch(_csv_data, gps_plot.xheader, gps_plot.yheader, _windows)
+
+			plt.plot(_csv_data[gps_plot.xheader], _csv_data[gps_plot.yheader])
+			for _result in _results:
+				print("window: {}, peaks: {}, valleys: {}, amplitude: {}, radius: {}, period: {}".format(
+						_result['window'], len(_result['xmaximas']), len(_result['xminimas']),
+						_result['amplitude'], _result['radius'], _result['period']))
+				plt.plot(_result['xmaximas'], _result['ymaximas'], 'g^', _result['xminimas'], _result['yminimas'], 'bv')
+			plt.ylabel(gps_plot.yheader)
+			plt.xlabel(gps_plot.xheader)
+			plt.grid(True)
+
+			# title is the log's name and how many windows/turns were searched:
+			_path = parse_bag_path(gps_plot.filename)[0] if is_bag_path(gps_plot.filename) else gps_plot.filename
+			_name = os.path.splitext(os.path.basename(_path))[0]
+			_label = "segmented turn" if _windows is None else "window"
+			plt.title("{} ({} {}{})".format(_name, len(_results), _label, "" if len(_results) == 1 else "s"))
+			plt.show()  # display plot!
+
 
 
 
@@ -0,0 +1,346 @@
+"""
+Streaming reader for ROS .bag files (format 2.0).
+
+Reads NavSatFix, Float64 and Twist(Stamped) messages straight out of a
+bag into typed numpy column chunks, named like the CSVs made with
+"rostopic echo -b file.bag -p /topic" (%time, field.latitude, ...),
+so the analysis tools can use the bags in Data/ without the export
+step. Pure python: no ROS install needed. Chunks are read one at a
+time, so memory stays bounded for multi-GB bags.
+
+Bag format: http://wiki.ros.org/Bags/Format/2.0
+"""
+
+from collections import OrderedDict
+import numpy as np
+import struct
+import bz2
+
+try:
+	import lz4.frame as lz4_frame  # optional, only for lz4 compressed bags
+except ImportError:
+	lz4_frame = None
+
+
+
+BAG_MAGIC = b'#ROSBAG V2.0\n'
+
+# record op codes:
+OP_MSG_DATA = 0x02
+OP_BAG_HEADER = 0x03
+OP_INDEX_DATA = 0x04
+OP_CHUNK = 0x05
+OP_CHUNK_INFO = 0x06
+OP_CONNECTION = 0x07
+
+CHUNK_ROWS = 65536  # messages per yielded column chunk
+
+_header_struct = struct.Struct('<3I')  # seq, stamp secs, stamp nsecs
+_navsatfix_struct = struct.Struct('<bH3d9dB')  # status, service, lat, lon, alt, covariance, covariance type
+_float64_struct = struct.Struct('<d')
+_twist_struct = struct.Struct('<6d')
+
+
+
+def _read_ros_header(data, offset):
+	"""
+	Reads a std_msgs/Header at offset.
+	Returns: (seq, stamp in ns, frame_id), new offset
+	"""
+	_seq, _secs, _nsecs = _header_struct.unpack_from(data, offset)
+	offset += _header_struct.size
+	_frame_id_len, = struct.unpack_from('<I', data, offset)
+	offset += 4
+	_frame_id = data[offset:offset + _frame_id_len].decode('utf-8')
+	offset += _frame_id_len
+	return (_seq, _secs * 1000000000 + _nsecs, _frame_id), offset
+
+
+def _decode_navsatfix(data):
+	_header, _offset = _read_ros_header(data, 0)
+	return _header + _navsatfix_struct.unpack_from(data, _offset)
+
+
+def _decode_float64(data):
+	return _float64_struct.unpack_from(data, 0)
+
+
+def _decode_twist(data):
+	return _twist_struct.unpack_from(data, 0)
+
+
+def _decode_twist_stamped(data):
+	_header, _offset = _read_ros_header(data, 0)
+	return _header + _twist_struct.unpack_from(data, _offset)
+
+
+# message type: (decoder, [(column, dtype), ..]), columns as in rostopic CSV exports
+MESSAGE_TYPES = {
+	'sensor_msgs/NavSatFix': (_decode_navsatfix, [
+		('field.header.seq', np.int64),
+		('field.header.stamp', np.int64),
+		('field.header.frame_id', str),
+		('field.status.status', np.int64),
+		('field.status.service', np.int64),
+		('field.latitude', np.float64),
+		('field.longitude', np.float64),
+		('field.altitude', np.float64)] +
+		[('field.position_covariance{}'.format(_i), np.float64) for _i in range(9)] +
+		[('field.position_covariance_type', np.int64)]),
+	'std_msgs/Float64': (_decode_float64, [
+		('field.data', np.float64)]),
+	'geometry_msgs/Twist': (_decode_twist, [
+		('field.linear.x', np.float64),
+		('field.linear.y', np.float64),
+		('field.linear.z', np.float64),
+		('field.angular.x', np.float64),
+		('field.angular.y', np.float64),
+		('field.angular.z', np.float64)]),
+	'geometry_msgs/TwistStamped': (_decode_twist_stamped, [
+		('field.header.seq', np.int64),
+		('field.header.stamp', np.int64),
+		('field.header.frame_id', str),
+		('field.twist.linear.x', np.float64),
+		('field.twist.linear.y', np.float64),
+		('field.twist.linear.z', np.float64),
+		('field.twist.angular.x', np.float64),
+		('field.twist.angular.y', np.float64),
+		('field.twist.angular.z', np.float64)]),
+}
+
+
+
+def _parse_record_header(header):
+	"""
+	Splits record header bytes into {name: value bytes}.
+	"""
+	_fields = {}
+	_offset = 0
+	while _offset < len(header):
+		_field_len, = struct.unpack_from('<I', header, _offset)
+		_offset += 4
+		_name, _, _value = header[_offset:_offset + _field_len].partition(b'=')
+		_fields[_name.decode('utf-8')] = _value
+		_offset += _field_len
+	return _fields
+
+
+def _iter_records(read):
+	"""
+	Yields (header fields, data) of every record read
+	with the read(n) function until it runs out.
+	"""
+	while True:
+		_len_bytes = read(4)
+		if len(_len_bytes) < 4:
+			return
+		_header_len, = struct.unpack('<I', _len_bytes)
+		_header = _parse_record_header(read(_header_len))
+		_data_len, = struct.unpack('<I', read(4))
+		yield _header, read(_data_len)
+
+
+def _decompress_chunk(header, data):
+	"""
+	Returns uncompressed records data of a chunk record.
+	"""
+	_compression = header['compression'].decode('utf-8')
+	if _compression == 'none':
+		return data
+	if _compression == 'bz2':
+		return bz2.decompress(data)
+	if _compression == 'lz4':
+		if lz4_frame is None:
+			raise ImportError("lz4 package is needed to read lz4 compressed bags")
+		return lz4_frame.decompress(data)
+	raise ValueError("unknown bag chunk compression: {}".format(_compression))
+
+
+def parse_bag_path(filename):
+	"""
+	Splits "file.bag:/topic" into ("file.bag", "/topic").
+	Topic is None if filename doesn't have one.
+	"""
+	_path, _sep, _topic = filename.partition('.bag:')
+	if not _sep:
+		return filename, None
+	return _path + '.bag', _topic
+
+
+def is_bag_path(filename):
+	"""
+	True if filename is a .bag file, optionally with a ":/topic".
+	"""
+	return parse_bag_path(filename)[0].endswith('.bag')
+
+
+
+class BagReader(object):
+	"""
+	Streams messages out of a ROS bag file, one chunk at a time.
+	"""
+
+	def __init__(self, filename):
+		self.filename = filename
+		with open(filename, 'rb') as _bag_file:
+			if _bag_file.read(len(BAG_MAGIC)) != BAG_MAGIC:
+				raise ValueError("{} is not a ROS bag (format 2.0) file".format(filename))
+
+	def iter_messages(self, topics=None):
+		"""
+		Yields (topic, message type, receive time in ns, message bytes)
+		for messages on topics (all topics if None), in file order.
+		"""
+		_connections = {}  # conn id: (topic, type)
+
+		with open(self.filename, 'rb') as _bag_file:
+			_bag_file.read(len(BAG_MAGIC))
+
+			for _header, _data in _iter_records(_bag_file.read):
+				_op = ord(_header['op'][:1])
+
+				if _op == OP_CHUNK:
+					_chunk = _decompress_chunk(_header, _data)
+					_records = _iter_records(_BytesReader(_chunk).read)
+				elif _op in (OP_CONNECTION, OP_MSG_DATA):
+					_records = [(_header, _data)]
+				else:
+					continue  # bag header, index data, chunk info
+
+				for _record_header, _record_data in _records:
+					_record_op = ord(_record_header['op'][:1])
+					_conn, = struct.unpack('<I', _record_header['conn'])
+
+					if _record_op == OP_CONNECTION:
+						_conn_fields = _parse_record_header(_record_data)
+						_connections[_conn] = (_record_header['topic'].decode('utf-8'),
+												_conn_fields['type'].decode('utf-8'))
+
+					elif _record_op == OP_MSG_DATA:
+						_topic, _type = _connections[_conn]
+						if topics is not None and _topic not in topics:
+							continue
+						_secs, _nsecs = struct.unpack('<II', _record_header['time'])
+						yield _topic, _type, _secs * 1000000000 + _nsecs, _record_data
+
+	def get_topics(self):
+		"""
+		Returns OrderedDict of {topic: message type} in the bag,
+		from the connection records at the end of the file.
+		"""
+		_topics = OrderedDict()
+		with open(self.filename, 'rb') as _bag_file:
+			_bag_file.read(len(BAG_MAGIC))
+			_bag_header, _ = next(_iter_records(_bag_file.read))
+			_index_pos, = struct.unpack('<Q', _bag_header['index_pos'])
+			_bag_file.seek(_index_pos)
+			for _header, _data in _iter_records(_bag_file.read):
+				if ord(_header['op'][:1]) == OP_CONNECTION:
+					_topic = _header['topic'].decode('utf-8')
+					_topics[_topic] = _parse_record_header(_data)['type'].decode('utf-8')
+		return _topics
+
+	def iter_column_chunks(self, topic, columns=None, chunk_rows=CHUNK_ROWS):
+		"""
+		Yields OrderedDicts of {column: np.ndarray} of up to chunk_rows
+		messages of topic, with a '%time' receive time (ns) column and
+		the rostopic CSV export columns of its message type.
+		Only columns are kept, if given.
+		"""
+		_type = self.get_topics().get(topic)
+		if _type not in MESSAGE_TYPES:
+			raise ValueError("topic {} has unsupported message type {}".format(topic, _type))
+
+		_decoder, _fields = MESSAGE_TYPES[_type]
+		_fields = [('%time', np.int64)] + _fields
+		_keep = [_i for _i, (_name, _dtype) in enumerate(_fields)
+					if columns is None or _name in columns]
+		if columns is not None:
+			_missing = set(columns) - set(_name for _name, _dtype in _fields)
+			if _missing:
+				raise ValueError("{} not in {} messages".format(sorted(_missing), _type))
+
+		_rows = []
+		for _topic, _msg_type, _time, _data in self.iter_messages([topic]):
+			_rows.append((_time,) + tuple(_decoder(_data)))
+			if len(_rows) >= chunk_rows:
+				yield _rows_to_columns(_rows, _fields, _keep)
+				_rows = []
+		if _rows:
+			yield _rows_to_columns(_rows, _fields, _keep)
+
+
+
+class _BytesReader(object):
+	"""
+	read(n) over a bytes buffer, without copying it into a BytesIO.
+	"""
+
+	def __init__(self, data):
+		self.data = data
+		self.offset = 0
+
+	def read(self, size):
+		_chunk = self.data[self.offset:self.offset + size]
+		self.offset += size
+		return _chunk
+
+
+
+def _rows_to_columns(rows, fields, keep):
+	"""
+	Converts list of decoded message tuples to {column: np.ndarray}.
+	"""
+	_columns = list(zip(*rows))
+	_data = OrderedDict()
+	for _i in keep:
+		_name, _dtype = fields[_i]
+		_data[_name] = np.array(_columns[_i], dtype=_dtype)
+	return _data
+
+
+def default_topic(reader):
+	"""
+	Returns first NavSatFix topic of a bag, else
+	the first topic of any supported message type.
+	"""
+	_topics = reader.get_topics()
+	for _wanted in ['sensor_msgs/NavSatFix'] + sorted(MESSAGE_TYPES):
+		for _topic, _type in _topics.items():
+			if _type == _wanted:
+				return _topic
+	raise ValueError("no supported message types in {}".format(reader.filename))
+
+
+def load_bag_columns(filename, columns=None, topic=None, row_step=1):
+	"""
+	Loads one topic of a bag into typed numpy columns, like
+	red_rover_io.load_csv_columns() does for exported CSVs.
+
+	Inputs:
+		+ filename - bag file, or "file.bag:/topic"
+		+ columns - column names to keep (all if None)
+		+ topic - topic to read, defaults to the ":/topic" of filename,
+			or the bag's first NavSatFix topic
+		+ row_step - keep every row_step'th message
+	Returns: OrderedDict of {column: np.ndarray}
+	"""
+	filename, _path_topic = parse_bag_path(filename)
+	reader = BagReader(filename)
+	topic = topic or _path_topic or default_topic(reader)
+
+	_chunks = []
+	_offset = 0  # messages before current chunk, for row_step across chunks
+	for _chunk in reader.iter_column_chunks(topic, columns):
+		_size = len(next(iter(_chunk.values())))
+		_start = (-_offset) % int(row_step)
+		_chunks.append(OrderedDict((_name, _array[_start::int(row_step)]) for _name, _array in _chunk.items()))
+		_offset += _size
+
+	if not _chunks:
+		_, _fields = MESSAGE_TYPES[reader.get_topics()[topic]]
+		_names = ['%time'] + [_name for _name, _dtype in _fields]
+		return OrderedDict((_name, np.array([])) for _name in _names if columns is None or _name in columns)
+
+	_names = list(_chunks[0].keys()) if columns is None else list(columns)
+	return OrderedDict((_name, np.concatenate([_chunk[_name] for _chunk in _chunks])) for _name in _names)
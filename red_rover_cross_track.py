@@ -0,0 +1,279 @@
+"""
+Cross-track and along-track error of rover trajectories against a course.
+
+For every trajectory point, finds the nearest course segment (not just
+the nearest course point) with a KD-tree over short pieces of the
+segments, and returns the signed distance to it (positive left of the
+course direction) and the distance along the course to the closest
+point. Works on simulated runs (red_rover_model.SimulationResult) and
+on CSV/bag logs, and summarizes errors as RMS, max and percentiles so
+parameter sweeps and field runs can be ranked by how well they follow
+the course.
+
+e.g.:
+	python red_rover_cross_track.py Data/2017-09-20/gps_field_test_fixtopic_20170920_reduced_utm.csv "Data/2018-01-15/*.csv"
+"""
+
+from red_rover_io import load_csv_columns, read_csv_header, LATLON_HEADERS
+from red_rover_bag import is_bag_path, load_bag_columns
+from red_rover_utm import latlon_to_utm
+from scipy.spatial import cKDTree
+import numpy as np
+import glob
+import sys
+
+
+
+PERCENTILES = (50, 90, 95, 99)
+
+# x, y columns looked for in a log, in order (lat/lons are projected to UTM):
+POSITION_HEADERS = [('easting', 'northing'), ('rover_pos_x', 'rover_pos_y'), ('x', 'y'), LATLON_HEADERS]
+
+
+
+class SegmentIndex(object):
+	"""
+	Spatial index of the segments of a course (cx, cy), built once and
+	reused for any number of trajectories (like pure_pursuit.Course).
+	Segments are split into pieces no longer than piece_length, and a
+	KD-tree of the piece midpoints gives nearest segment candidates;
+	a point's nearest segment is exact once the best candidate is closer
+	than the k'th piece midpoint minus half a piece (k doubles until then).
+	"""
+
+	def __init__(self, cx, cy, piece_length=None):
+		cx = np.asarray(cx, dtype=np.float64)
+		cy = np.asarray(cy, dtype=np.float64)
+		_finite = np.isfinite(cx) & np.isfinite(cy)
+		cx, cy = cx[_finite], cy[_finite]
+		if len(cx) < 2:
+			raise ValueError("course needs at least 2 points")
+
+		self.x0, self.y0 = cx[:-1], cy[:-1]
+		self.dx, self.dy = np.diff(cx), np.diff(cy)
+		self.length = np.hypot(self.dx, self.dy)
+		self.s = np.concatenate(([0.0], np.cumsum(self.length)))  # course distance at each point
+
+		# unit direction of each segment (0 for repeated points):
+		_length = np.where(self.length > 0, self.length, 1.0)
+		self.ux, self.uy = self.dx / _length, self.dy / _length
+
+		if piece_length is None:
+			_lengths = self.length[self.length > 0]
+			piece_length = 2.0 * np.median(_lengths) if len(_lengths) else 1.0
+		_pieces = np.maximum(np.ceil(self.length / piece_length), 1).astype(np.int64)
+		self.piece_segment = np.repeat(np.arange(len(self.length)), _pieces)
+		_starts = np.concatenate(([0], np.cumsum(_pieces)[:-1]))
+		_t = (np.arange(len(self.piece_segment)) - np.repeat(_starts, _pieces) + 0.5) / _pieces[self.piece_segment]
+		self.half_piece = float(np.max(self.length / _pieces)) / 2.0
+		self.tree = cKDTree(np.column_stack((self.x0[self.piece_segment] + _t * self.dx[self.piece_segment],
+											self.y0[self.piece_segment] + _t * self.dy[self.piece_segment])))
+
+	def __len__(self):
+		return len(self.length)
+
+	def _project(self, x, y, segments):
+		"""
+		Clamped position t (0 to 1) of the projections of x, y onto segments.
+		"""
+		_dx, _dy = self.dx[segments], self.dy[segments]
+		_length_sq = _dx * _dx + _dy * _dy
+		_t = ((x - self.x0[segments]) * _dx + (y - self.y0[segments]) * _dy) / np.where(_length_sq > 0, _length_sq, 1.0)
+		return np.clip(_t, 0.0, 1.0)
+
+	def nearest_segments(self, x, y, k=8):
+		"""
+		Index of the nearest segment of each (finite) x, y point, and its distance.
+		"""
+		_points = np.column_stack((x, y))
+		_segments = np.zeros(len(_points), dtype=np.int64)
+		_distances = np.zeros(len(_points))
+		_todo = np.arange(len(_points))
+		_k = min(k, self.tree.n)
+
+		while len(_todo):
+			_piece_distances, _pieces = self.tree.query(_points[_todo], k=_k)
+			_piece_distances = _piece_distances.reshape(len(_todo), -1)
+			_candidates = self.piece_segment[_pieces.reshape(len(_todo), -1)]
+
+			_x, _y = x[_todo, np.newaxis], y[_todo, np.newaxis]
+			_t = self._project(_x, _y, _candidates)
+			_candidate_distances = np.hypot(_x - (self.x0[_candidates] + _t * self.dx[_candidates]),
+											_y - (self.y0[_candidates] + _t * self.dy[_candidates]))
+			_best = np.argmin(_candidate_distances, axis=1)
+			_rows = np.arange(len(_todo))
+			_best_distances = _candidate_distances[_rows, _best]
+
+			# no segment outside the candidates can be closer:
+			_resolved = (_best_distances <= _piece_distances[:, -1] - self.half_piece) | (_k >= self.tree.n)
+			_segments[_todo[_resolved]] = _candidates[_rows, _best][_resolved]
+			_distances[_todo[_resolved]] = _best_distances[_resolved]
+			_todo = _todo[~_resolved]
+			_k = min(2 * _k, self.tree.n)
+
+		return _segments, _distances
+
+	def query(self, x, y, k=8):
+		"""
+		Cross-track and along-track errors of trajectory points x, y
+		(arrays of any shape, e.g. (steps, K) batch runs).
+		Returns: dict of arrays shaped like x:
+			+ 'cross_track' - signed distance [m] to the nearest course segment,
+				positive left of the course direction
+			+ 'along_track' - course distance [m] from the start to the closest point
+			+ 'segment' - index of the nearest segment
+			+ 'x_closest', 'y_closest' - closest point on the course
+			NaN (segment -1) where x, y aren't finite.
+		"""
+		x = np.asarray(x, dtype=np.float64)
+		y = np.asarray(y, dtype=np.float64)
+		_shape = x.shape
+		x, y = x.ravel(), y.ravel()
+		_finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+		_x, _y = x[_finite], y[_finite]
+
+		_segments, _distances = self.nearest_segments(_x, _y, k)
+		_t = self._project(_x, _y, _segments)
+		_x_closest = self.x0[_segments] + _t * self.dx[_segments]
+		_y_closest = self.y0[_segments] + _t * self.dy[_segments]
+
+		# side of the course, using the mean direction of both segments at a shared vertex:
+		_ux, _uy = self.ux[_segments].copy(), self.uy[_segments].copy()
+		_at_start = (_t <= 0.0) & (_segments > 0)
+		_at_end = (_t >= 1.0) & (_segments < len(self) - 1)
+		_ux[_at_start] += self.ux[_segments[_at_start] - 1]
+		_uy[_at_start] += self.uy[_segments[_at_start] - 1]
+		_ux[_at_end] += self.ux[_segments[_at_end] + 1]
+		_uy[_at_end] += self.uy[_segments[_at_end] + 1]
+		_side = _ux * (_y - _y_closest) - _uy * (_x - _x_closest)
+
+		_result = {}
+		for _name, _values, _fill in (
+				('cross_track', np.where(_side < 0, -_distances, _distances), np.nan),
+				('along_track', self.s[_segments] + _t * self.length[_segments], np.nan),
+				('segment', _segments, -1),
+				('x_closest', _x_closest, np.nan),
+				('y_closest', _y_closest, np.nan)):
+			_array = np.full(len(x), _fill, dtype=np.asarray(_values).dtype)
+			_array[_finite] = _values
+			_result[_name] = _array.reshape(_shape)
+		return _result
+
+
+
+def cross_track_stats(cross_track, percentiles=PERCENTILES, axis=None):
+	"""
+	Summary of signed cross-track errors, NaNs ignored.
+	Inputs:
+		+ cross_track - array of errors [m], e.g. SegmentIndex.query()['cross_track']
+		+ percentiles - percentiles of the absolute error to report
+		+ axis - e.g. 0 for per-rover stats of (steps, K) batch errors
+	Returns: dict of 'count', 'mean' (mean absolute error), 'bias' (mean signed
+		error), 'rms', 'max' (absolute) and 'p50', 'p90', .. of absolute errors
+	"""
+	cross_track = np.asarray(cross_track, dtype=np.float64)
+	_abs = np.abs(cross_track)
+	_count = np.sum(np.isfinite(cross_track), axis=axis)
+	if not np.all(_count):
+		raise ValueError("no finite cross-track errors")
+	_stats = {
+		'count': _count,
+		'mean': np.nanmean(_abs, axis=axis),
+		'bias': np.nanmean(cross_track, axis=axis),
+		'rms': np.sqrt(np.nanmean(cross_track**2, axis=axis)),
+		'max': np.nanmax(_abs, axis=axis)
+	}
+	for _percentile in percentiles:
+		_stats['p{}'.format(_percentile)] = np.nanpercentile(_abs, _percentile, axis=axis)
+	if axis is None:
+		_stats = dict((_key, int(_value) if _key == 'count' else float(_value)) for _key, _value in _stats.items())
+	return _stats
+
+
+
+def load_track_xy(filename, headers=None):
+	"""
+	Loads a log's positions in metres (CSV, or ROS bag as "file.bag[:/topic]").
+	Inputs:
+		+ headers - (x, y) columns, defaults to the first of POSITION_HEADERS
+			in the file; lat/lon columns are projected to UTM
+	Returns: x, y arrays (NaN for blank rows)
+	"""
+	if headers is None:
+		if is_bag_path(filename):
+			headers = LATLON_HEADERS
+		else:
+			_headers = read_csv_header(filename)
+			headers = next((_pair for _pair in POSITION_HEADERS if _pair[0] in _headers and _pair[1] in _headers), None)
+			if headers is None:
+				raise ValueError("no position columns in {}".format(filename))
+
+	if is_bag_path(filename):
+		_data = load_bag_columns(filename, list(headers))
+	else:
+		_data = load_csv_columns(filename, list(headers), dtypes={headers[0]: np.float64, headers[1]: np.float64})
+	_x, _y = _data[headers[0]], _data[headers[1]]
+
+	if tuple(headers) == tuple(LATLON_HEADERS):
+		_finite = np.isfinite(_x) & np.isfinite(_y)
+		_eastings, _northings = np.full(len(_x), np.nan), np.full(len(_x), np.nan)
+		_eastings[_finite], _northings[_finite], _, _ = latlon_to_utm(_x[_finite], _y[_finite])
+		return _eastings, _northings
+	return _x, _y
+
+
+def score_result(result, segment_index):
+	"""
+	Cross-track stats of a red_rover_model.SimulationResult
+	(or anything with x, y trajectory arrays).
+	"""
+	return cross_track_stats(segment_index.query(result.x, result.y)['cross_track'])
+
+
+def score_logs(segment_index, filenames, headers=None):
+	"""
+	Cross-track stats of each log in filenames, skipping
+	logs without positions (or without the given headers).
+	Returns: list of stats dicts, each with its 'filename'
+	"""
+	_scores = []
+	for _filename in filenames:
+		try:
+			_x, _y = load_track_xy(_filename, headers)
+			_stats = cross_track_stats(segment_index.query(_x, _y)['cross_track'])
+		except ValueError as e:
+			print("Skipping {}, {}".format(_filename, e))
+			continue
+		_stats['filename'] = _filename
+		_scores.append(_stats)
+	return _scores
+
+
+def format_scores(scores, percentiles=PERCENTILES):
+	"""
+	Returns score_logs() stats as a tab separated text table.
+	"""
+	_columns = ['count', 'mean', 'bias', 'rms', 'max'] + ['p{}'.format(_p) for _p in percentiles]
+	_lines = ["\t".join(_columns + ['name'])]
+	for _stats in scores:
+		_values = ["{:d}".format(_stats['count'])] + ["{:.3f}".format(_stats[_column]) for _column in _columns[1:]]
+		_lines.append("\t".join(_values + [str(_stats.get('filename', ''))]))
+	return "\n".join(_lines)
+
+
+
+
+if __name__ == '__main__':
+
+	# course file (x/y, easting/northing or lat/lon columns), then logs or globs to score:
+	if len(sys.argv) < 3:
+		sys.exit("usage: python red_rover_cross_track.py course.csv log.csv [more logs or globs]")
+
+	course_x, course_y = load_track_xy(sys.argv[1])
+	segment_index = SegmentIndex(course_x, course_y)
+
+	filenames = []
+	for _arg in sys.argv[2:]:
+		filenames.extend(sorted(glob.glob(_arg)) or [_arg])
+
+	print(format_scores(score_logs(segment_index, filenames)))
@@ -24,11 +24,14 @@ wrapper of https://github.com/AndrewWalker/Dubins-Curves
 """
 
 # import red_rover_model
+from red_rover_model import RoverModel
 import numpy as np
 from scipy.interpolate import interp1d # Different interface to the same function
 from scipy.interpolate import Rbf, InterpolatedUnivariateSpline
 from algorithms import savitzky_golay
 import matplotlib.pyplot as plt
+from collections import OrderedDict
+import multiprocessing
 import math
 import dubins
 import sys
@@ -147,60 +150,100 @@ def plot_interp1d_example(x, y, xi, yi, yhat_interp, yhat):
 	plt.show()
 
 
-def plot_dubins_path(qs, q0, q1, show=True):
+def _plot_axes(filename=None):
+	"""
+	Returns axes to plot on: a pyplot figure's, or a figure drawn with
+	the Agg canvas if it's only saved to filename (no display needed).
+	"""
+	if filename is None:
+		return plt.gca()
+	from matplotlib.figure import Figure
+	from matplotlib.backends.backend_agg import FigureCanvasAgg
+	_fig = Figure(figsize=(10, 8))
+	FigureCanvasAgg(_fig)
+	return _fig.add_subplot(111)
+
+
+def plot_dubins_poses(poses, offsets=None, ax=None, tick_length=1.0):
+	"""
+	Draws sampled dubins poses: path line, sample dots, a heading tick
+	per pose and start/end dots per segment, as a handful of artists no
+	matter how many poses there are (ticks are one LineCollection).
+	Inputs:
+		+ poses - (M, 3) array of [x, y, heading]
+		+ offsets - segment start indexes into poses (see plan_dubins_path()),
+			one segment if None
+		+ ax - axes to draw on (current pyplot axes if None)
+	Returns: ax
+	"""
+	from matplotlib.collections import LineCollection
+
+	ax = ax if ax is not None else plt.gca()
+	poses = np.asarray(poses)
+	offsets = np.asarray(offsets if offsets is not None else [0, len(poses) - 1])
+
+	xs = poses[:, 0]
+	ys = poses[:, 1]
+	us = xs + tick_length * np.cos(poses[:, 2])
+	vs = ys + tick_length * np.sin(poses[:, 2])
+
+	ax.plot(xs, ys, 'b-')
+	ax.plot(xs, ys, 'r.')
+	ax.add_collection(LineCollection(np.stack((np.column_stack((xs, ys)), np.column_stack((us, vs))), axis=1), colors='r'))
+	_starts = offsets[:-1]
+	_ends = np.maximum(offsets[1:] - 1, _starts)  # last sample of each segment
+	ax.plot(xs[_starts], ys[_starts], 'go', markersize=5)  # dubins start points
+	ax.plot(xs[_ends], ys[_ends], 'ro', markersize=5)  # dubins end points
+	ax.autoscale_view()
+	return ax
+
+
+def plot_dubins_path(qs, q0, q1, show=True, filename=None):
 		"""
 		Plots the dubins path between a starting and ending point.
 		Inputs:
 			qs - dubins path data [[x,y,angle], ..]
 			q0 - initial position [x,y,angle]
 			q1 - target position [x,y,angle]
+			filename - saves the plot to this file instead of showing it
 		Returns: None
 		"""
-
-		print("QS Array (plot_dubins_path): {}".format(qs))
-
-		xs = qs[:,0]
-		ys = qs[:,1]
-		us = xs + np.cos(qs[:, 2])
-		vs = ys + np.sin(qs[:, 2])
-		# plt.plot(q0[0], q0[1], 'gx', markeredgewidth=4, markersize=10)  # actual start point
-		# plt.plot(q1[0], q1[1], 'rx', markeredgewidth=4, markersize=10)  # actual end point
-		plt.plot(xs, ys, 'b-')
-		plt.plot(xs, ys, 'r.')
-		plt.plot(qs[0][0], qs[0][1], 'go', markersize=5)  # dubins start point
-		plt.plot(qs[-1][0], qs[-1][1], 'ro', markersize=5)  # dubins end point
-		# plt.plot(sample_points[:,0], sample_points[:,1], 'k-')  # plot sample points path
-		for i in xrange(qs.shape[0]):
-			plt.plot([xs[i], us[i]], [ys[i], vs[i]],'r-')
-
-		# Adding x/y range for plots:
-		# plt.xlim(min(qs[:,0]) - 1, max(qs[:,0]) + 1)
-		# plt.ylim(min(qs[:,1]) - 1, max(qs[:,1]) + 1)
-
-		if show:
+		ax = _plot_axes(filename)
+		plot_dubins_poses(qs, [0, len(qs)], ax=ax)
+		# ax.plot(q0[0], q0[1], 'gx', markeredgewidth=4, markersize=10)  # actual start point
+		# ax.plot(q1[0], q1[1], 'rx', markeredgewidth=4, markersize=10)  # actual end point
+
+		if filename is not None:
+			ax.figure.savefig(filename)
+		elif show:
 			plt.show()
 
 
-def plot_full_dubins_path(qs_array, x_path, y_path):
+def plot_dubins_plan(poses, offsets, x_path, y_path, filename=None):
 	"""
-	Like plot_dubins_path() function, but plots a full set of points
-	instead a single A -> B two point dataset.
+	Plots a full dubins plan (see plan_dubins_path()) with the path
+	points it goes through, shown or saved to filename (headless).
 	"""
-	# Initial setup: No directional plotting, just dots and path at the moment..
-
-	# print("QS Array: {}".format(qs_array))
+	ax = _plot_axes(filename)
+	plot_dubins_poses(poses, offsets, ax=ax)
+	ax.plot(x_path, y_path, 'bo')  # overlay path points onto plot
 
-	for qs in qs_array:
-		# xs = qs[:,0]
-		# ys = qs[:,1]
-		# plt.plot(xs, ys, 'b-')
-		# plt.plot(xs, ys, 'r.')
-		# plot_dubins_path(qs_array[i], ab_array[i][0], ab_array[i][1], show=False)
-		plot_dubins_path(qs['qs'], qs['q0'], qs['q1'], show=False)
+	if filename is not None:
+		ax.figure.savefig(filename)
+	else:
+		plt.show()  # display plot
 
-	plt.plot(x_path, y_path, 'bo')  # overlay path points onto plot
 
-	plt.show()  # display plot
+def plot_full_dubins_path(qs_array, x_path, y_path, filename=None):
+	"""
+	Like plot_dubins_path() function, but plots a full set of points
+	instead a single A -> B two point dataset.
+	Inputs:
+		qs_array - list of {'q0': .., 'q1': .., 'qs': ..} segments
+	"""
+	_offsets = np.concatenate(([0], np.cumsum([len(qs['qs']) for qs in qs_array]))).astype(int)
+	_poses = np.concatenate([qs['qs'] for qs in qs_array]).reshape(-1, 3)
+	plot_dubins_plan(_poses, _offsets, x_path, y_path, filename)
 
 
 def build_dubins_points(points):
@@ -216,45 +259,344 @@ def build_dubins_points(points):
 	return dubins_path
 
 
-def dubins_example_1(initial_pos, final_pos, x_path=None, y_path=None):
+def waypoint_headings(waypoints, initial_heading=None):
+	"""
+	Derives a heading for every waypoint from the path geometry: the
+	direction of the first leg at the first waypoint, of the last leg
+	at the last one, and the bisector of the incoming and outgoing
+	legs in between (the incoming leg for a full reversal).
+	Inputs:
+		+ waypoints - (N, 2) array of [x, y], N >= 2
+		+ initial_heading - overrides the first heading (e.g., rover's current yaw)
+	Returns: (N,) array of headings [rad]
+	"""
+	waypoints = np.asarray(waypoints, dtype=np.float64)[:, :2]
+	if len(waypoints) < 2:
+		raise ValueError("need at least 2 waypoints to derive headings")
+
+	_legs = np.diff(waypoints, axis=0)
+	_lengths = np.hypot(_legs[:, 0], _legs[:, 1])
+	_units = _legs / np.where(_lengths > 0, _lengths, 1.0)[:, None]  # zero legs stay zero
+	_leg_headings = np.arctan2(_legs[:, 1], _legs[:, 0])
+
+	_bisectors = _units[:-1] + _units[1:]
+	_headings = np.empty(len(waypoints))
+	_headings[0] = _leg_headings[0]
+	_headings[-1] = _leg_headings[-1]
+	_headings[1:-1] = np.where(np.hypot(_bisectors[:, 0], _bisectors[:, 1]) > 1e-9,
+								np.arctan2(_bisectors[:, 1], _bisectors[:, 0]),
+								_leg_headings[:-1])
+	if initial_heading is not None:
+		_headings[0] = initial_heading
+	return _headings
+
+
+def _mod2pi(angle):
+	return angle % (2 * math.pi)
+
+
+def _turn_center(q, radius, turn):
+	"""
+	Center of the turn circle of pose q, turn 1 for left (ccw), -1 for right (cw).
+	"""
+	return np.array([q[0] - turn * radius * math.sin(q[2]), q[1] + turn * radius * math.cos(q[2])])
+
+
+def _csc_path(q0, q1, turn0, turn1, radius0, radius1):
+	"""
+	Curve-straight-curve path with turn radius0 then radius1, the
+	straight on the tangent between the two turn circles.
+	Returns: list of (turn, length, radius) parts, or None if there isn't one
+	"""
+	_centers = _turn_center(q1, radius1, turn1) - _turn_center(q0, radius0, turn0)
+	_offset = turn1 * radius1 - turn0 * radius0  # center offset across the straight
+	_straight_sq = _centers.dot(_centers) - _offset**2
+	if _straight_sq < 0:
+		return None
+	_straight = math.sqrt(_straight_sq)
+	_heading = math.atan2(_centers[1], _centers[0]) - math.atan2(_offset, _straight)
+	return [(turn0, _mod2pi(turn0 * (_heading - q0[2])) * radius0, radius0),
+			(0, _straight, None),
+			(turn1, _mod2pi(turn1 * (q1[2] - _heading)) * radius1, radius1)]
+
+
+def _ccc_paths(q0, q1, turn, radius, middle_radius):
+	"""
+	Curve-curve-curve paths (turn, -turn, turn), the middle circle
+	touching both end circles (two solutions).
+	Returns: list of paths, as lists of (turn, length, radius) parts
+	"""
+	_c0 = _turn_center(q0, radius, turn)
+	_c1 = _turn_center(q1, radius, turn)
+	_between = _c1 - _c0
+	_distance = math.hypot(_between[0], _between[1])
+	_reach = radius + middle_radius  # end circle center to middle circle center
+	if _distance == 0 or _distance > 2 * _reach:
+		return []
+
+	_along = _distance / 2.0
+	_across = math.sqrt(max(_reach**2 - _along**2, 0.0))
+	_unit = _between / _distance
+	_normal = np.array([-_unit[1], _unit[0]])
+
+	_paths = []
+	for _side in (1, -1):
+		_middle = _c0 + _along * _unit + _side * _across * _normal
+		# headings where the circles touch (tangent direction on the end circles):
+		_touch0 = (_middle - _c0) / _reach
+		_touch1 = (_middle - _c1) / _reach
+		_heading0 = math.atan2(_touch0[1], _touch0[0]) + turn * math.pi / 2
+		_heading1 = math.atan2(_touch1[1], _touch1[0]) + turn * math.pi / 2
+		_paths.append([(turn, _mod2pi(turn * (_heading0 - q0[2])) * radius, radius),
+						(-turn, _mod2pi(-turn * (_heading1 - _heading0)) * middle_radius, middle_radius),
+						(turn, _mod2pi(turn * (q1[2] - _heading1)) * radius, radius)])
+	return _paths
+
+
+def asymmetric_dubins_path(q0, q1, left_radius, right_radius):
+	"""
+	Shortest of the dubins path words (LSL, RSR, LSR, RSL, LRL, RLR)
+	from pose q0 to q1, with left turns of left_radius and right turns
+	of right_radius (e.g., a rover that turns tighter one way).
+	Returns: list of (turn, length, radius) parts, turn 1 left, -1 right, 0 straight
+	"""
+	_radius = {1: left_radius, -1: right_radius}
+	_paths = [_csc_path(q0, q1, _turn0, _turn1, _radius[_turn0], _radius[_turn1])
+				for _turn0 in (1, -1) for _turn1 in (1, -1)]
+	for _turn in (1, -1):
+		_paths.extend(_ccc_paths(q0, q1, _turn, _radius[_turn], _radius[-_turn]))
+	_paths = [_path for _path in _paths if _path is not None]
+	return min(_paths, key=lambda _path: sum(_length for _turn, _length, _r in _path))
+
+
+def sample_path_parts(q0, parts, step_size):
+	"""
+	Samples poses every step_size along (turn, length, radius) path
+	parts starting at pose q0 (end pose excluded, like pydubins).
+	Returns: (K, 3) array of [x, y, heading]
+	"""
+	_total = sum(_length for _turn, _length, _radius in parts)
+	_distances = np.arange(0.0, _total, step_size)
+	_poses = np.empty((len(_distances), 3))
+
+	_x, _y, _heading = q0
+	_start = 0.0
+	for _turn, _length, _radius in parts:
+		_in_part = (_distances >= _start) & (_distances < _start + _length)
+		_ds = _distances[_in_part] - _start
+		if _turn == 0:
+			_poses[_in_part] = np.column_stack((_x + _ds * math.cos(_heading), _y + _ds * math.sin(_heading),
+												np.full(len(_ds), _heading)))
+			_x, _y = _x + _length * math.cos(_heading), _y + _length * math.sin(_heading)
+		else:
+			_headings = _heading + _turn * _ds / _radius
+			_poses[_in_part] = np.column_stack((_x + _turn * _radius * (np.sin(_headings) - math.sin(_heading)),
+												_y - _turn * _radius * (np.cos(_headings) - math.cos(_heading)),
+												_headings))
+			_end_heading = _heading + _turn * _length / _radius
+			_x += _turn * _radius * (math.sin(_end_heading) - math.sin(_heading))
+			_y -= _turn * _radius * (math.cos(_end_heading) - math.cos(_heading))
+			_heading = _end_heading
+		_start += _length
+
+	_poses[:, 2] = _mod2pi(_poses[:, 2])
+	return _poses
+
+
+def sample_dubins_segment(q0, q1, turning_radius, step_size):
+	"""
+	Samples the shortest dubins path from pose q0 to q1 (end pose
+	excluded), with either pydubins API (path_sample < 1.0, shortest_path >= 1.0).
+	turning_radius can also be a (left, right) pair for different
+	left and right turn radii (see asymmetric_dubins_path()).
+	Returns: (K, 3) array of [x, y, heading]
+	"""
+	if isinstance(turning_radius, (tuple, list)):
+		return sample_path_parts(q0, asymmetric_dubins_path(q0, q1, *turning_radius), step_size)
+	if hasattr(dubins, 'path_sample'):
+		_qs, _ = dubins.path_sample(q0, q1, turning_radius, step_size)
+	else:
+		_qs, _ = dubins.shortest_path(q0, q1, turning_radius).sample_many(step_size)
+	return np.array(_qs, dtype=np.float64).reshape(-1, 3)
+
+
+class DubinsSegmentCache(object):
+	"""
+	LRU cache of sampled dubins segments, keyed by the end pose relative
+	to the start pose (dx, dy, dtheta rotated into the start frame, rounded
+	to precision decimals) plus turning_radius and step_size. Routes that
+	repeat the same geometry (e.g., RedRoverController.create_straight_rows
+	rows and row turns) only sample each distinct segment once; hits are
+	the cached samples moved to the segment's start pose.
+	"""
+
+	def __init__(self, maxsize=1024, precision=6):
+		self.maxsize = maxsize
+		self.precision = precision
+		self.hits = 0
+		self.misses = 0
+		self._segments = OrderedDict()  # key: (K, 3) samples from pose (0, 0, 0)
+
+	def relative_key(self, q0, q1, turning_radius, step_size):
+		"""
+		Returns cache key of the segment from pose q0 to q1.
+		"""
+		_dx, _dy = q1[0] - q0[0], q1[1] - q0[1]
+		_cos, _sin = math.cos(q0[2]), math.sin(q0[2])
+		_dtheta = (q1[2] - q0[2]) % (2 * math.pi)
+		_key = (_cos * _dx + _sin * _dy, -_sin * _dx + _cos * _dy, _dtheta)
+		_key = tuple(round(_value, self.precision) + 0.0 for _value in _key)  # + 0.0: no -0.0 keys
+		return _key + (tuple(turning_radius) if isinstance(turning_radius, list) else turning_radius, step_size)
+
+	def sample(self, q0, q1, turning_radius, step_size):
+		"""
+		Like sample_dubins_segment(), from the cache if the
+		relative pose was sampled before.
+		Returns: (K, 3) array of [x, y, heading]
+		"""
+		_key = self.relative_key(q0, q1, turning_radius, step_size)
+		_local = self._segments.pop(_key, None)
+		if _local is None:
+			self.misses += 1
+			_local = sample_dubins_segment((0.0, 0.0, 0.0), _key[:3], turning_radius, step_size)
+		else:
+			self.hits += 1
+		self._segments[_key] = _local  # most recently used last
+		while len(self._segments) > self.maxsize:
+			self._segments.popitem(last=False)
+
+		# local samples --> start pose frame:
+		_cos, _sin = math.cos(q0[2]), math.sin(q0[2])
+		_qs = np.empty_like(_local)
+		_qs[:, 0] = q0[0] + _cos * _local[:, 0] - _sin * _local[:, 1]
+		_qs[:, 1] = q0[1] + _sin * _local[:, 0] + _cos * _local[:, 1]
+		_qs[:, 2] = (_local[:, 2] + q0[2]) % (2 * math.pi)
+		return _qs
+
+	def info(self):
+		"""
+		Returns dict of hits, misses, current size and maxsize.
+		"""
+		return {'hits': self.hits, 'misses': self.misses, 'size': len(self._segments), 'maxsize': self.maxsize}
+
+	def clear(self):
+		self._segments.clear()
+		self.hits = 0
+		self.misses = 0
+
+
+segment_cache = DubinsSegmentCache()  # shared by plan_dubins_path() calls in this process
+
+
+
+def _plan_segments(args):
+	"""
+	Pool worker: samples the dubins segments between consecutive
+	poses of a chunk of waypoint poses.
+	Returns: list of segment sample arrays, cache (None if not cached)
+	"""
+	_poses, turning_radius, step_size, cache = args
+	_sample = cache.sample if cache is not None else sample_dubins_segment
+	_segments = [_sample(tuple(_poses[i]), tuple(_poses[i + 1]), turning_radius, step_size)
+					for i in range(len(_poses) - 1)]
+	return _segments, cache
+
+
+def plan_dubins_path(waypoints, turning_radius=1.0, step_size=0.5, headings=None,
+						initial_heading=None, processes=1, chunk_size=256, cache=segment_cache):
+	"""
+	Plans dubins segments through a whole waypoint sequence.
+	Inputs:
+		+ waypoints - (N, 2) array of [x, y] (or (N, 3) with headings)
+		+ headings - (N,) headings [rad], derived with waypoint_headings() if None
+			(and waypoints has no heading column)
+		+ initial_heading - heading at the first waypoint, if derived
+		+ processes - worker processes for long routes (None for cpu count),
+			1 plans in this process
+		+ chunk_size - segments per worker task
+		+ cache - DubinsSegmentCache to reuse repeated segments from, None to
+			sample every segment (workers each use an empty cache of the same
+			size and their hit/miss counts are added to it)
+	Returns: poses - (M, 3) array of [x, y, heading] samples of every
+		segment, plus the final waypoint pose as the last row,
+		offsets - (N,) array, segment i is poses[offsets[i]:offsets[i + 1]]
+	"""
+	waypoints = np.asarray(waypoints, dtype=np.float64)
+	if headings is None:
+		headings = waypoints[:, 2] if waypoints.shape[1] > 2 else waypoint_headings(waypoints, initial_heading)
+	_poses = np.column_stack((waypoints[:, :2], headings))
+
+	# chunks of waypoint poses, sharing their end poses:
+	_chunks = [_poses[_i:_i + chunk_size + 1] for _i in range(0, len(_poses) - 1, chunk_size)]
+
+	if processes == 1 or len(_chunks) < 2:
+		_results = [_plan_segments((_chunk, turning_radius, step_size, cache)) for _chunk in _chunks]
+	else:
+		_worker_cache = DubinsSegmentCache(cache.maxsize, cache.precision) if cache is not None else None
+		pool = multiprocessing.Pool(processes)
+		try:
+			_results = pool.map(_plan_segments, [(_chunk, turning_radius, step_size, _worker_cache) for _chunk in _chunks], chunksize=1)
+		finally:
+			pool.close()
+			pool.join()
+		if cache is not None:
+			cache.hits += sum(_worker_cache.hits for _, _worker_cache in _results)
+			cache.misses += sum(_worker_cache.misses for _, _worker_cache in _results)
+
+	_segments = [_segment for _segments, _ in _results for _segment in _segments]
+	_offsets = np.concatenate(([0], np.cumsum([len(_segment) for _segment in _segments]))).astype(int)
+	return np.concatenate(_segments + [_poses[-1:]]), _offsets
+
+
+def plan_rover_dubins_path(waypoints, rover_model=None, step_size=0.5, **plan_kwargs):
+	"""
+	plan_dubins_path() for paths the rover can drive: left and right
+	turns no tighter than RoverModel.min_turn_radius() of each direction
+	(from the turn tests), plus the rover's pivot angle for every pose
+	from the model's pivot lookup tables.
+	Returns: poses, offsets (see plan_dubins_path()), pivots - (M,) pivot
+		angles [deg], left turns positive, right turns negative
+	"""
+	rover_model = rover_model or RoverModel()
+	_radii = (rover_model.min_turn_radius("left"), rover_model.min_turn_radius("right"))
+	_poses, _offsets = plan_dubins_path(waypoints, _radii, step_size, **plan_kwargs)
+	return _poses, _offsets, rover_pivots(_poses, rover_model)
+
+
+def rover_pivots(poses, rover_model):
+	"""
+	Rover pivot angle [deg] to drive each pose of a path toward the next,
+	from the path's curvature (heading change per distance), left turns
+	positive. The last pose gets the pivot of the one before it.
+	"""
+	_steps = np.hypot(np.diff(poses[:, 0]), np.diff(poses[:, 1]))
+	_turns = np.angle(np.exp(1j * np.diff(poses[:, 2])))  # heading change, wrapped to [-pi, pi]
+	with np.errstate(divide='ignore', invalid='ignore'):
+		_radii = np.abs(_steps / _turns)  # inf on straights
+
+	_pivots = np.where(_turns > 0, rover_model.lookup_rover_pivot(_radii, "left"),
+						-rover_model.lookup_rover_pivot(_radii, "right"))
+	_pivots[~np.isfinite(_radii) | (_steps == 0)] = 0.0
+	return np.append(_pivots, _pivots[-1:]) if len(_pivots) else np.zeros(len(poses))
+
+
+def dubins_example_1(initial_pos, final_pos, x_path=None, y_path=None, plot_filename=None):
 	"""
 	A simple example of the dubins model
+	(plot saved to plot_filename if given, instead of shown)
 	"""
 
-	qs_array = []  # an array of qs of type np.array
-	ab_array = []  # A-->B position array (e.g., [[(Ax,Ay,Atheta), (Bx,By,Btheta)],..])
-	dubins_data = {}
 	# turning_radius = 2.5  # min turning radius? (.pyx file just says 'turning radius')
 	# step_size = 0.5  # sampling interval
 	turning_radius = 1.0
 	step_size = 0.5
 
-	# Initializing dubins model:
-	q0 = initial_pos
-	q1 = (x_path[0], y_path[0], math.pi)
-	qs,_ = dubins.path_sample(q0, q1, turning_radius, step_size)
-	qs = np.array(qs)
-	dubins_data = {
-		'q0': q0,
-		'q1': q1,
-		'qs': qs
-	}
-	qs_array.append(dubins_data)
-
-	# Execute dubins model across sample path:
-	for i in range(1, len(x_path)):
-		q0 = q1
-		q1 = (x_path[i], y_path[i], math.pi)
-		qs,_ = dubins.path_sample(q0, q1, turning_radius, step_size)
-		qs = np.array(qs)
-		dubins_data = {
-			'q0': q0,
-			'q1': q1,
-			'qs': qs
-		}
-		qs_array.append(dubins_data)
-
-	plot_full_dubins_path(qs_array, x_path, y_path)  # Plot model path
+	# Dubins segments from initial position through every path point,
+	# headings from the path itself:
+	_waypoints = np.column_stack((np.r_[initial_pos[0], x_path], np.r_[initial_pos[1], y_path]))
+	_poses, _offsets = plan_dubins_path(_waypoints, turning_radius, step_size, initial_heading=initial_pos[2])
+
+	plot_dubins_plan(_poses, _offsets, x_path, y_path, plot_filename)  # Plot model path
 
 	# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -0,0 +1,219 @@
+"""
+Streaming GPX export for the red rover tools.
+
+Writes route (rtept) or track (trkpt) points to a file handle as
+column chunks come in (e.g., from red_rover_io.iter_csv_chunks or
+red_rover_bag.BagReader.iter_column_chunks), so exporting a
+multi-hour log takes one pass and constant memory. Points can be
+thinned by a fixed row step, by time or by distance travelled.
+"""
+
+from red_rover_simplify import simplify_latlon
+import numpy as np
+
+
+
+GPX_HEADER = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<gpx
+   version="1.1"
+   creator=""
+   xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+   xmlns="http://www.topografix.com/GPX/1/1"
+   xsi:schemaLocation="http://www.topografix.com/GPX/1/1/gpx.xsd">
+<metadata>
+<name> {name} </name>
+   <copyright author="">
+      <year>{year}</year>
+   </copyright>
+</metadata>
+"""
+GPX_FOOTER = "</gpx>\n"
+
+# point element: (opening tags, closing tags)
+CONTAINERS = {
+	'rtept': ("<rte>\n", "</rte>\n"),
+	'trkpt': ("<trk>\n<trkseg>\n", "</trkseg>\n</trk>\n")
+}
+
+EARTH_RADIUS = 6371008.8  # mean earth radius [m]
+
+
+
+class GPXWriter(object):
+	"""
+	Writes GPX points to an open file handle, one chunk
+	of lat/lon arrays at a time.
+	e.g.:
+		with open("out.gpx", 'w') as gpx_file:
+			with GPXWriter(gpx_file) as writer:
+				for _chunk in chunks:
+					writer.write_points(_chunk['field.latitude'], _chunk['field.longitude'])
+	"""
+
+	def __init__(self, fileobj, element='rtept', name="", year=2018):
+		if element not in CONTAINERS:
+			raise ValueError("element must be one of {}".format(sorted(CONTAINERS)))
+		self.fileobj = fileobj
+		self.element = element
+		self.count = 0  # points written
+		self.fileobj.write(GPX_HEADER.format(name=name, year=year))
+		self.fileobj.write(CONTAINERS[element][0])
+
+	def write_points(self, lats, lons, times=None):
+		"""
+		Writes a chunk of points. times (int64 ns since epoch,
+		like ROS %time) are written as <time> elements.
+		"""
+		_template = '<{0} lat="{{:.9f}}" lon="{{:.9f}}"></{0}>\n'.format(self.element)
+		if times is None:
+			self.fileobj.writelines(_template.format(_lat, _lon) for _lat, _lon in zip(lats, lons))
+		else:
+			_template = '<{0} lat="{{:.9f}}" lon="{{:.9f}}"><time>{{}}Z</time></{0}>\n'.format(self.element)
+			_stamps = np.datetime_as_string(np.asarray(times, dtype=np.int64).astype('datetime64[ns]'), unit='ms')
+			self.fileobj.writelines(_template.format(_lat, _lon, _stamp) for _lat, _lon, _stamp in zip(lats, lons, _stamps))
+		self.count += len(lats)
+
+	def close(self):
+		"""
+		Writes closing tags (doesn't close fileobj).
+		"""
+		self.fileobj.write(CONTAINERS[self.element][1])
+		self.fileobj.write(GPX_FOOTER)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None:
+			self.close()
+
+
+
+class Decimator(object):
+	"""
+	Picks the points to keep from consecutive chunks of a log:
+	every row_step'th row first, then, of those, the next point at least
+	min_interval of time and min_distance metres travelled after the
+	last kept point (both thresholds must be met when both are set, so
+	each option only thins the track further). Only the last kept point's
+	time and distance are carried between chunks, so it works on a stream.
+	Rows with non-finite lat/lons are never kept, and don't count towards
+	the distance travelled. With a tolerance [m], the kept points of each
+	chunk are then simplified (see red_rover_simplify), keeping each
+	chunk's first and last point.
+	"""
+
+	def __init__(self, row_step=1, min_interval=None, min_distance=None, tolerance=None, method='dp'):
+		self.row_step = int(row_step)
+		self.min_interval = min_interval  # same units as times (ns for ROS %time)
+		self.min_distance = min_distance  # metres
+		self.tolerance = tolerance  # metres
+		self.method = method
+		self._rows = 0  # rows seen
+		self._max_time = None  # latest time seen (times going backwards don't count)
+		self._distance = 0.0  # metres travelled up to the last finite point seen
+		self._last_point = None  # (lat, lon) of the last finite point seen
+		self._kept_any = False  # whether a point has been kept yet
+		self._kept_time = None  # time of the last kept point
+		self._kept_distance = None  # distance travelled at the last kept point
+
+	def select(self, lats, lons, times=None):
+		"""
+		Returns boolean mask of the points of a chunk to keep.
+		"""
+		lats = np.asarray(lats, dtype=np.float64)
+		lons = np.asarray(lons, dtype=np.float64)
+		_keep = (np.arange(self._rows, self._rows + len(lats)) % self.row_step) == 0
+		self._rows += len(lats)
+		_finite = np.isfinite(lats) & np.isfinite(lons)
+		if self.min_interval and times is None:
+			raise ValueError("time decimation needs times")
+
+		_rows = np.flatnonzero(_finite)  # rows that are points
+		if not len(_rows):
+			return _keep & _finite
+
+		_times = None
+		if self.min_interval:
+			_times = np.asarray(times, dtype=np.int64)[_rows]
+			if self._max_time is not None:
+				_times = np.maximum(_times, self._max_time)
+			_times = np.maximum.accumulate(_times)
+			self._max_time = _times[-1]
+
+		_distances = None
+		if self.min_distance:
+			_lats, _lons = lats[_rows], lons[_rows]
+			_prev_lats = np.r_[self._last_point[0] if self._last_point else _lats[0], _lats[:-1]]
+			_prev_lons = np.r_[self._last_point[1] if self._last_point else _lons[0], _lons[:-1]]
+			_distances = self._distance + np.cumsum(haversine(_prev_lats, _prev_lons, _lats, _lons))
+			self._distance = _distances[-1]
+			self._last_point = (_lats[-1], _lons[-1])
+
+		# candidates are the step rows that are points:
+		_candidates = np.flatnonzero(_keep[_rows])
+		_keep[:] = False
+		if _times is not None:
+			_times = _times[_candidates]
+		if _distances is not None:
+			_distances = _distances[_candidates]
+
+		if _times is None and _distances is None:
+			_keep[_rows[_candidates]] = True
+		else:
+			# jump from each kept point to the first candidate past both thresholds:
+			_i = 0
+			while _i < len(_candidates):
+				if self._kept_any:
+					if _times is not None:
+						_i = max(_i, int(np.searchsorted(_times, self._kept_time + self.min_interval, side='left')))
+					if _distances is not None:
+						_i = max(_i, int(np.searchsorted(_distances, self._kept_distance + self.min_distance, side='left')))
+					if _i >= len(_candidates):
+						break
+				_keep[_rows[_candidates[_i]]] = True
+				self._kept_any = True
+				self._kept_time = _times[_i] if _times is not None else None
+				self._kept_distance = _distances[_i] if _distances is not None else None
+				_i += 1
+
+		if self.tolerance:
+			_kept = np.flatnonzero(_keep)
+			_keep[:] = False
+			_keep[_kept[simplify_latlon(lats[_kept], lons[_kept], self.tolerance, self.method)]] = True
+
+		return _keep
+
+
+
+def haversine(lats0, lons0, lats1, lons1):
+	"""
+	Great circle distance [m] between arrays of lat/lon points.
+	"""
+	_lat0, _lon0, _lat1, _lon1 = [np.radians(_a) for _a in (lats0, lons0, lats1, lons1)]
+	_a = np.sin((_lat1 - _lat0) / 2.0)**2 + np.cos(_lat0) * np.cos(_lat1) * np.sin((_lon1 - _lon0) / 2.0)**2
+	return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(_a, 1.0)))
+
+
+def write_gpx(filename, column_chunks, lat_header='field.latitude', lon_header='field.longitude',
+				time_header=None, element='rtept', row_step=1, min_interval=None, min_distance=None, name=None,
+				tolerance=None, method='dp'):
+	"""
+	Streams column chunks of a log into a GPX file.
+	Inputs:
+		+ column_chunks - iterable of {header: np.ndarray} chunks
+		+ time_header - time column (int64 ns) for <time> elements and min_interval
+		+ element - 'rtept' (route) or 'trkpt' (track)
+		+ row_step, min_interval, min_distance, tolerance, method - decimation
+			and simplification, see Decimator
+	Returns: number of points written
+	"""
+	_decimator = Decimator(row_step, min_interval, min_distance, tolerance, method)
+	with open(filename, 'w') as _gpx_file:
+		with GPXWriter(_gpx_file, element, name if name is not None else filename) as writer:
+			for _chunk in column_chunks:
+				_lats, _lons = _chunk[lat_header], _chunk[lon_header]
+				_times = _chunk[time_header] if time_header is not None else None
+				_keep = _decimator.select(_lats, _lons, _times)
+				writer.write_points(_lats[_keep], _lons[_keep], _times[_keep] if _times is not None else None)
+	return writer.count
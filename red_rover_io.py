@@ -0,0 +1,363 @@
+"""
+Shared loading of GPS data for the red rover tools.
+
+Reads ROS-exported CSVs (the %time/field.* files created with
+rostopic echo -b) straight into typed numpy column arrays, so
+red_rover_analysis.py, gmap_plots.py and red_rover_model.py don't
+have to hold every field of every row as a python string.
+
+Parsed columns (plus derived UTM columns) can be cached next to
+the CSV as one .npy file per column, which later loads memory-map
+instead of re-parsing the CSV (see load_cached_columns).
+"""
+
+from collections import OrderedDict
+from red_rover_utm import latlon_to_utm
+import numpy as np
+import logging
+import shutil
+import json
+import csv
+import sys
+import os
+
+
+
+# ROS time columns, stored as int64 nanoseconds:
+TIME_HEADERS = ('%time', 'field.header.stamp')
+
+CHUNK_ROWS = 65536  # rows parsed per conversion chunk
+
+CACHE_SUFFIX = '.colcache'  # cache dir name is CSV filename + suffix
+CACHE_VERSION = 2  # bump to invalidate caches written by older code
+
+# derived UTM columns, named as in GPSPlot.add_utm_to_csvdata output:
+LATLON_HEADERS = ('field.latitude', 'field.longitude')
+UTM_HEADERS = ('easting', 'northing', 'zone number', 'zone letter')
+
+
+
+def default_dtype(header):
+	"""
+	Returns the dtype a column is loaded as when
+	none is requested: int64 nanoseconds for ROS time
+	columns, None (inferred, see _convert_column) otherwise.
+	"""
+	if header in TIME_HEADERS:
+		return np.int64
+	return None
+
+
+def _convert_column(values, dtype):
+	"""
+	Converts a list of CSV fields to a numpy array of dtype.
+	dtype None infers int64 if every field is an integer, else
+	float64, falling back to str, so rewritten files keep their
+	values (e.g., "23" stays "23"). Blank fields in float
+	columns become NaN.
+	"""
+	if dtype is None:
+		try:
+			return np.array(values, dtype=np.int64)
+		except (ValueError, OverflowError):
+			pass
+		try:
+			return _convert_column(values, np.float64)
+		except ValueError:
+			return np.array(values, dtype=str)
+
+	dtype = np.dtype(dtype)
+
+	if dtype.kind in ('U', 'S', 'O'):
+		return np.array(values, dtype=dtype)
+
+	try:
+		return np.array(values, dtype=dtype)
+	except ValueError:
+		pass
+
+	if dtype.kind in ('i', 'u'):
+		# e.g., "1.50714738486656E+018" from spreadsheet-edited CSVs:
+		return _convert_column(values, np.float64).astype(dtype)
+
+	_floats = [float(value) if value.strip() else np.nan for value in values]
+	return np.array(_floats, dtype=dtype)
+
+
+# inferred column dtypes, narrowest first:
+INFERRED_DTYPES = (np.int64, np.float64, str)
+
+
+def _widest_dtype(dtype, array):
+	"""
+	The wider of an inferred column dtype and an array's dtype.
+	"""
+	_kind = array.dtype.kind
+	_array_dtype = str if _kind in ('U', 'S') else (np.int64 if _kind in ('i', 'u') else np.float64)
+	return max(dtype, _array_dtype, key=INFERRED_DTYPES.index)
+
+
+def _convert_chunks(fields, chunks, dtypes, inferred):
+	"""
+	Converts the raw fields collected for each column into
+	arrays appended to chunks, then empties fields. Columns
+	without a requested dtype (inferred[i] True) are settled as
+	int64, float64 or str on their first chunk, and widened
+	(earlier chunks too) if a later chunk needs it.
+	"""
+	for _i, _values in enumerate(fields):
+		_dtype = dtypes[_i]
+		if not inferred[_i]:
+			_array = _convert_column(_values, _dtype)
+		else:
+			_array = _convert_column(_values, None)
+			_widest = _widest_dtype(_dtype or np.int64, _array)
+			if _widest is not str:
+				_array = _array.astype(_widest)
+			elif _array.dtype.kind not in ('U', 'S'):
+				_array = _convert_column(_values, str)  # keep the fields' own text
+			if _widest is not _dtype:
+				chunks[_i] = [_chunk.astype(_widest) for _chunk in chunks[_i]]
+			dtypes[_i] = _widest
+		chunks[_i].append(_array)
+		fields[_i] = []
+
+
+def read_csv_header(filename):
+	"""
+	Returns the first row (headers) of a CSV file.
+	"""
+	with open(filename, 'r') as _csv_file:
+		reader = csv.reader(_csv_file)
+		return next(reader, [])
+
+
+def load_csv_columns(filename, columns=None, dtypes=None, header=True, row_step=1):
+	"""
+	Parses a ROS-exported CSV into typed numpy column arrays.
+
+	Inputs:
+		+ filename - CSV file to read
+		+ columns - header names (or int column indices) to read,
+			defaults to every column in the header row
+		+ dtypes - optional {column: dtype} overrides of default_dtype()
+		+ header - whether the first row of the file holds headers
+		+ row_step - keep every row_step'th data row (e.g., 2 - every other row)
+	Returns: OrderedDict of {column: np.ndarray}, in the requested order.
+	Raises ValueError if a requested header isn't in the file.
+	"""
+	dtypes = dtypes or {}
+	row_step = int(row_step)
+
+	with open(filename, 'r') as _csv_file:
+		reader = csv.reader(_csv_file)
+
+		_headers = next(reader, []) if header else []
+		if columns is None:
+			columns = list(_headers)
+
+		_indexes = []
+		for _column in columns:
+			if isinstance(_column, int):
+				_indexes.append(_column)
+			else:
+				_indexes.append(_headers.index(_column))  # ValueError if missing
+
+		_dtypes = [dtypes.get(_column, default_dtype(_column)) for _column in columns]
+		_inferred = [_dtype is None for _dtype in _dtypes]
+		_chunks = [[] for _column in columns]  # converted arrays per column
+		_fields = [[] for _column in columns]  # raw fields of current chunk
+
+		for _row_num, _row in enumerate(reader):
+			if _row_num % row_step or not _row:
+				continue
+			for _i, _index in enumerate(_indexes):
+				_fields[_i].append(_row[_index])
+			if len(_fields[0]) >= CHUNK_ROWS:
+				_convert_chunks(_fields, _chunks, _dtypes, _inferred)
+
+		_convert_chunks(_fields, _chunks, _dtypes, _inferred)
+
+	_data = OrderedDict()
+	for _i, _column in enumerate(columns):
+		_data[_column] = np.concatenate(_chunks[_i])
+		_chunks[_i] = None
+
+	return _data
+
+
+def iter_csv_chunks(filename, columns=None, dtypes=None, chunk_rows=CHUNK_ROWS, header=True):
+	"""
+	Streams a CSV as OrderedDicts of up to chunk_rows typed column
+	arrays (like red_rover_bag.BagReader.iter_column_chunks), so a long
+	or still growing log doesn't have to be loaded at once. columns are
+	header names or int indexes, as in load_csv_columns().
+	Column dtypes are inferred on the first chunk; a later chunk
+	may widen them (e.g., int64 to float64) but can't change
+	chunks already yielded.
+	"""
+	dtypes = dtypes or {}
+
+	with open(filename, 'r') as _csv_file:
+		reader = csv.reader(_csv_file)
+
+		_headers = next(reader, []) if header else []
+		if columns is None:
+			columns = list(_headers)
+		_indexes = [_column if isinstance(_column, int) else _headers.index(_column)
+					for _column in columns]  # ValueError if missing
+		_dtypes = [dtypes.get(_column, default_dtype(_column)) for _column in columns]
+		_inferred = [_dtype is None for _dtype in _dtypes]
+		_fields = [[] for _column in columns]
+
+		for _row in reader:
+			if not _row:
+				continue
+			for _i, _index in enumerate(_indexes):
+				_fields[_i].append(_row[_index])
+			if len(_fields[0]) >= chunk_rows:
+				yield _fields_to_chunk(columns, _fields, _dtypes, _inferred)
+
+		if _fields[0]:
+			yield _fields_to_chunk(columns, _fields, _dtypes, _inferred)
+
+
+def _fields_to_chunk(columns, fields, dtypes, inferred):
+	"""
+	Converts raw fields of one chunk to {column: np.ndarray},
+	emptying fields for the next chunk.
+	"""
+	_chunks = [[] for _column in columns]
+	_convert_chunks(fields, _chunks, dtypes, inferred)
+	return OrderedDict((_column, _chunks[_i][0]) for _i, _column in enumerate(columns))
+
+
+def write_csv_columns(filename, columns):
+	"""
+	Writes an OrderedDict of equal length column
+	arrays to a CSV file, headers first.
+	"""
+	_headers = list(columns.keys())
+	with open(filename, 'w') as _csv_file:
+		writer = csv.writer(_csv_file)
+		writer.writerow(_headers)
+		writer.writerows(zip(*[columns[_header].tolist() for _header in _headers]))
+	return filename
+
+
+
+def cache_path(filename):
+	"""
+	Returns cache directory of a CSV file.
+	"""
+	return filename + CACHE_SUFFIX
+
+
+def _source_key(filename):
+	"""
+	Identifies the version of a CSV file the cache was built from.
+	"""
+	_stat = os.stat(filename)
+	return {
+		'version': CACHE_VERSION,
+		'python': sys.version_info[0],  # str columns are bytes in python 2 caches
+		'path': os.path.abspath(filename),
+		'mtime': _stat.st_mtime,
+		'size': _stat.st_size
+	}
+
+
+def add_utm_columns(columns):
+	"""
+	Adds easting, northing, zone number and zone letter columns
+	computed from ROS lat/lon columns, if there are lat/lons
+	and no UTM columns yet. Modifies and returns columns.
+	"""
+	if not all(_header in columns for _header in LATLON_HEADERS):
+		return columns
+	if any(_header in columns for _header in UTM_HEADERS):
+		return columns
+	_lats, _lons = columns[LATLON_HEADERS[0]], columns[LATLON_HEADERS[1]]
+	if not len(_lats) or not np.isfinite(_lats).any():
+		return columns
+	_eastings, _northings, _zone_number, _zone_letter = latlon_to_utm(_lats, _lons)
+	columns[UTM_HEADERS[0]] = _eastings
+	columns[UTM_HEADERS[1]] = _northings
+	columns[UTM_HEADERS[2]] = np.full(len(_eastings), _zone_number, dtype=np.int64)
+	columns[UTM_HEADERS[3]] = np.repeat(np.array(_zone_letter), len(_eastings))
+	return columns
+
+
+def read_cache(filename):
+	"""
+	Returns OrderedDict of memory-mapped columns cached for
+	filename, or None if there's no cache or it's stale.
+	"""
+	_cache_dir = cache_path(filename)
+	try:
+		with open(os.path.join(_cache_dir, 'meta.json'), 'r') as _meta_file:
+			_meta = json.load(_meta_file)
+	except (IOError, OSError, ValueError):
+		return None
+
+	if _meta.get('source') != _source_key(filename):
+		return None
+
+	_columns = OrderedDict()
+	for _i, _header in enumerate(_meta['columns']):
+		_columns[_header] = np.load(os.path.join(_cache_dir, '{}.npy'.format(_i)), mmap_mode='r')
+	return _columns
+
+
+def write_cache(filename, columns):
+	"""
+	Saves columns as one .npy file per column in the cache
+	dir of filename, replacing any old cache.
+	"""
+	_cache_dir = cache_path(filename)
+	_tmp_dir = '{}.tmp{}'.format(_cache_dir, os.getpid())
+	if os.path.isdir(_tmp_dir):
+		shutil.rmtree(_tmp_dir)
+	os.mkdir(_tmp_dir)
+
+	for _i, _array in enumerate(columns.values()):
+		np.save(os.path.join(_tmp_dir, '{}.npy'.format(_i)), _array)
+	with open(os.path.join(_tmp_dir, 'meta.json'), 'w') as _meta_file:
+		json.dump({'source': _source_key(filename), 'columns': list(columns.keys())}, _meta_file)
+
+	if os.path.isdir(_cache_dir):
+		shutil.rmtree(_cache_dir)
+	os.rename(_tmp_dir, _cache_dir)
+
+
+def load_cached_columns(filename, columns=None, dtypes=None, row_step=1):
+	"""
+	Like load_csv_columns() for CSVs with a header row, but the
+	first load parses every column (plus UTM columns derived from
+	ROS lat/lons) into a cache next to the CSV, and later loads
+	memory-map the cache instead of parsing the CSV again.
+	The cache is rebuilt when the CSV's path, mtime or size change.
+	"""
+	_cached = read_cache(filename)
+	if _cached is None:
+		_cached = add_utm_columns(load_csv_columns(filename))
+		try:
+			write_cache(filename, _cached)
+		except (IOError, OSError) as e:
+			logging.warning("couldn't cache {}: {}".format(filename, e))
+		else:
+			_cached = read_cache(filename) or _cached
+
+	dtypes = dtypes or {}
+	if columns is None:
+		columns = list(_cached.keys())
+
+	_data = OrderedDict()
+	for _column in columns:
+		if _column not in _cached:
+			raise ValueError("{} is not in {} columns".format(_column, filename))
+		_array = _cached[_column][::int(row_step)]
+		if _column in dtypes and np.dtype(dtypes[_column]) != _array.dtype:
+			_array = _array.astype(dtypes[_column])
+		_data[_column] = _array
+	return _data
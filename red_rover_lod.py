@@ -0,0 +1,117 @@
+"""
+Level-of-detail GeoJSON map export for the red rover tools.
+
+Precomputes each track simplified for a handful of google map zoom
+ranges (about one screen pixel of tolerance per range, see
+red_rover_simplify) and writes every level as a compact GeoJSON file,
+plus a small index of the levels. google_map_dragdrop_geojson.html
+loads the index (?lod=index.json, with the folder served over http,
+e.g. "python -m SimpleHTTPServer") and only fetches the level of the
+current zoom, or shows dropped level files by zoom.
+"""
+
+from red_rover_simplify import simplify_latlon
+from collections import OrderedDict
+import numpy as np
+import json
+import math
+import os
+
+
+
+LOD_ZOOMS = (0, 15, 17, 19, 21)  # min zoom of each level
+MAX_ZOOM = 22
+METRES_PER_PIXEL = 156543.03392  # at zoom 0 on the equator, for 256px map tiles
+COORD_DECIMALS = 7  # ~1cm
+
+
+
+def zoom_tolerance(zoom, lat):
+	"""
+	Ground size [m] of a map pixel at a zoom level and latitude.
+	"""
+	return METRES_PER_PIXEL * math.cos(math.radians(lat)) / 2**zoom
+
+
+def lod_levels(lat, zooms=LOD_ZOOMS):
+	"""
+	Returns list of (min zoom, max zoom, tolerance [m]) levels, the
+	tolerance being a pixel at the level's max zoom (a pixel at its
+	min zoom for the most detailed level).
+	"""
+	_levels = []
+	for _i, _zoom in enumerate(zooms):
+		_max_zoom = zooms[_i + 1] - 1 if _i + 1 < len(zooms) else MAX_ZOOM
+		_tolerance_zoom = _max_zoom if _i + 1 < len(zooms) else _zoom
+		_levels.append((_zoom, _max_zoom, zoom_tolerance(_tolerance_zoom, lat)))
+	return _levels
+
+
+def _feature(name, lats, lons, properties):
+	"""
+	GeoJSON LineString feature of a track.
+	"""
+	_coordinates = np.round(np.column_stack((lons, lats)), COORD_DECIMALS).tolist()
+	_properties = OrderedDict([('name', name)])
+	_properties.update(properties)
+	return OrderedDict([
+		('type', "Feature"),
+		('geometry', OrderedDict([('type', "LineString"), ('coordinates', _coordinates)])),
+		('properties', _properties)
+	])
+
+
+def write_lod_geojson(out_dir, tracks, name="tracks", zooms=LOD_ZOOMS, method='dp'):
+	"""
+	Writes multi-resolution GeoJSON files of tracks.
+	Inputs:
+		+ out_dir - folder for the files (created if missing)
+		+ tracks - OrderedDict of {track name: (lats, lons)} or
+			{track name: (lats, lons, color)}, all on one file per level
+		+ name - file name prefix
+	Returns: filename of the level index, name.lod.json, listing
+		each level's file, zoom range, tolerance and point count
+	"""
+	if not os.path.isdir(out_dir):
+		os.makedirs(out_dir)
+
+	_tracks = [(_name, np.asarray(_track[0], dtype=np.float64), np.asarray(_track[1], dtype=np.float64),
+				_track[2] if len(_track) > 2 else None) for _name, _track in tracks.items()]
+	_all_lats = np.concatenate([_lats for _, _lats, _, _ in _tracks])
+	_all_lons = np.concatenate([_lons for _, _, _lons, _ in _tracks])
+	_levels = lod_levels(float(np.nanmean(_all_lats)), zooms)
+
+	_index = OrderedDict([
+		('type', "lod-index"),
+		('bounds', [float(np.nanmin(_all_lons)), float(np.nanmin(_all_lats)),
+					float(np.nanmax(_all_lons)), float(np.nanmax(_all_lats))]),
+		('levels', [])
+	])
+
+	for _level, (_min_zoom, _max_zoom, _tolerance) in enumerate(_levels):
+		_properties = OrderedDict([('level', _level), ('min_zoom', _min_zoom), ('max_zoom', _max_zoom),
+									('tolerance', round(_tolerance, 3))])
+		_features = []
+		_points = 0
+		for _name, _lats, _lons, _color in _tracks:
+			_indexes = simplify_latlon(_lats, _lons, _tolerance, method)
+			_points += len(_indexes)
+			_track_properties = OrderedDict(_properties)
+			if _color is not None:
+				_track_properties['color'] = _color
+			_features.append(_feature(_name, _lats[_indexes], _lons[_indexes], _track_properties))
+
+		_filename = "{}.lod{}.geojson".format(name, _level)
+		with open(os.path.join(out_dir, _filename), 'w') as _geojson_file:
+			json.dump(OrderedDict([('type', "FeatureCollection"), ('properties', _properties), ('features', _features)]),
+						_geojson_file, separators=(',', ':'))
+
+		_level_info = OrderedDict(_properties)
+		_level_info['file'] = _filename
+		_level_info['points'] = _points
+		_index['levels'].append(_level_info)
+
+	_index_filename = os.path.join(out_dir, "{}.lod.json".format(name))
+	with open(_index_filename, 'w') as _index_file:
+		json.dump(_index, _index_file, indent=1, separators=(',', ': '))
+	return _index_filename
@@ -15,7 +15,15 @@ import sys
 import math
 import csv
 import codecs
-from algorithms.pure_pursuit import State, PurePursuitModel
+import itertools
+import logging
+import multiprocessing
+from algorithms.pure_pursuit import State, BatchState, PurePursuitModel, Course
+from red_rover_io import load_csv_columns, load_cached_columns
+from red_rover_cross_track import SegmentIndex, cross_track_stats
+
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -56,6 +64,8 @@ class RoverModel(object):
         self.V = V  # rover's target speed, 1mph ~0.447m/s
         #####################################################################################
 
+        self.build_turn_tables()
+
 
     def calculate_radius(self, ref1, ref2):
         """
@@ -82,6 +92,53 @@ class RoverModel(object):
             return None
 
 
+    def build_turn_tables(self, num=256):
+        """
+        Precomputes the turn equations of calculate_rover_pivot() as
+        lookup tables of pivot angle vs. turn curvature (1/radius),
+        from straight (0) to the max turning angle of each direction,
+        so lookups are an interpolation instead of fractional powers.
+        """
+        self.turn_tables = {}
+        for direction, a, b, pivot_max in (("left", self.left_a, self.left_b, self.left_turn_max),
+                                            ("right", self.right_a, self.right_b, self.right_turn_max)):
+            pivots = np.linspace(0.0, pivot_max, num)
+            curvatures = pivots**b / a  # inverse of pivot = (a / radius)**(1 / b)
+            self.turn_tables[direction] = (curvatures, pivots)
+
+
+    def lookup_rover_pivot(self, radius, direction):
+        """
+        Like calculate_rover_pivot() (also for arrays of radii), from
+        the turn tables. Turns tighter than the rover can pivot for
+        get the max turning angle.
+        """
+        curvatures, pivots = self.turn_tables[direction]
+        with np.errstate(divide='ignore'):
+            return np.interp(1.0 / np.asarray(radius, dtype=np.float64), curvatures, pivots)
+
+
+    def lookup_turn_radius(self, pivot, direction):
+        """
+        Turn radius for a pivot angle (inverse of lookup_rover_pivot()),
+        inf for a pivot of 0.
+        """
+        curvatures, pivots = self.turn_tables[direction]
+        with np.errstate(divide='ignore'):
+            return 1.0 / np.interp(pivot, pivots, curvatures)
+
+
+    def min_turn_radius(self, direction):
+        """
+        Tightest turn radius the rover can drive in direction: the
+        measured min radius, or the radius at the max turning angle
+        if that's wider.
+        """
+        if direction == "left":
+            return max(self.left_radius_min, float(self.lookup_turn_radius(self.left_turn_max, "left")))
+        return max(self.right_radius_min, float(self.lookup_turn_radius(self.right_turn_max, "right")))
+
+
     def calculate_angle(self, radius, step_distance):
         """
         Different than "calculate_rover_pivot", which is the angle
@@ -124,10 +181,10 @@ class RoverModel(object):
         self.graph_ymax = y_path[-1] + ext
 
 
-    def create_plots(self, cx, cy, x, y, t, v, yaw, ind_slope):
+    def create_plots(self, cx, cy, x, y, t, v, yaw, ind_slope, show=True, figure_name=None):
         """
         Plot rover GPS path and course, among other things.
-
+        show - display plot window, figure_name - save plot as image file
         """
         flg, ax = plt.subplots(1)
         plt.plot(cx, cy, ".r", label="course")
@@ -156,20 +213,18 @@ class RoverModel(object):
         # plt.ylabel("Index slope[m/s]")
         # plt.grid(True)
 
-        # Saving output CSV for analyzing turn position and index
-        # for path intersection problem:
-        # filename = 'Data/2018-01-15/path_cross_example_data_2.csv'
-        # save_csv_file(filename, csv_data_out)
-        # print "CSV {} saved.".format(filename)
-
         # Saving plots as images settings:
-        # figure_name = 'path_follow_peanut_field_20180115_RSS{}.png'.format(row_step_size)
-        # print("Saving figure: {}".format(figure_name))
-        # plt.savefig('Plots/2018_01/{}'.format(figure_name))  # for plots across look-aheads
-        # print("Plot saved.")
+        # figure_name = 'Plots/2018_01/path_follow_peanut_field_20180115_RSS{}.png'.format(row_step_size)
+        if figure_name:
+            logger.info("Saving figure: {}".format(figure_name))
+            plt.savefig(figure_name)  # for plots across look-aheads
+            logger.info("Plot saved.")
 
         # Display plot:
-        plt.show()
+        if show:
+            plt.show()
+        else:
+            plt.close(flg)
 
 
 
@@ -186,35 +241,23 @@ def get_data_from_csv(filename, t_header, x_header, y_header, row_step_size=2):
         + x_header - header name for easting values
         + y_header - header name for northing values
     """
-    _csv_data, x_path, y_path, t_path = [], [], [], []
+    _headers = [t_header, x_header, y_header]
+    _dtypes = dict((_header, np.float64) for _header in _headers)
 
-    # Read in the file:
-    with open(filename, 'r') as _csv_file:
-    # with codecs.open(filename, 'rU', 'utf-16') as _csv_file:
-        reader = csv.reader(_csv_file)
-        _csv_data = list(reader)
-    _csv_file.close()
+    # if header list items are integers and not strings, assume they're indices
+    # and the file has no header row:
+    _has_header = not all(isinstance(_header, int) for _header in _headers)
 
-    # if header list items are integers and not strings, assume they're indices:
-    start_index = 0
-    try:
-        t_index = _csv_data[0].index(t_header)
-        x_index = _csv_data[0].index(x_header)  # trying to get header for x path
-        y_index = _csv_data[0].index(y_header)  # trying to get header for y path
-        start_index = 1  # headers are strings, so skip first row
-    except ValueError as e:
-        t_index = t_header # assuming ValueError means header is int instead of string
-        x_index = x_header  # assume x_header is index of x col
-        y_index = y_header  # same for y
-
-    # Getting time, easting, and northing from every row in CSV path data:
-    # for row in _csv_data[start_index:-1]:
-    # Getting time, easting, and northing from every 5th row in CSV path data:
-    for i in range(start_index, len(_csv_data), int(row_step_size)):
-        _row = _csv_data[i]
-        t_path.append(float(_row[t_index]))
-        x_path.append(float(_row[x_index]))
-        y_path.append(float(_row[y_index]))
+    # Read in time, easting, and northing columns from every row_step_size'th row
+    # (from the CSV's column cache when there's a header row):
+    if _has_header:
+        _csv_data = load_cached_columns(filename, _headers, _dtypes, row_step=row_step_size)
+    else:
+        _csv_data = load_csv_columns(filename, _headers, _dtypes, header=False, row_step=row_step_size)
+
+    t_path = _csv_data[t_header]
+    x_path = _csv_data[x_header]
+    y_path = _csv_data[y_header]
 
     return t_path, x_path, y_path
 
@@ -254,17 +297,88 @@ def get_gps_time_diffs(ct):
 
 
 
+class SimulationResult(object):
+    """
+    Compact result of one simulate_red_rover_model() run:
+    trajectory arrays trimmed to the steps actually taken,
+    cross-track error stats and completion time. Plotting
+    and CSV export are separate, optional stages.
+    """
+
+    def __init__(self, t, x, y, yaw, v, target_ind, completion_time=None, params=None):
+        self.t = t
+        self.x = x
+        self.y = y
+        self.yaw = yaw
+        self.v = v
+        self.target_ind = target_ind
+        self.completion_time = completion_time  # None if end of course wasn't reached
+        self.params = params  # e.g., sweep parameters of the run
+        self.cross_track = None  # signed distance to the course at each step, left positive
+        self.along_track = None  # distance along the course at each step
+        self.cross_track_stats = None  # see red_rover_cross_track.cross_track_stats()
+        self.cross_track_mean = None
+        self.cross_track_rms = None
+        self.cross_track_max = None
+
+
+    def __len__(self):
+        return len(self.t)
+
+
+    def index_slope(self):
+        """
+        Change in target index per second at each step.
+        """
+        return np.concatenate(([0.0], np.diff(self.target_ind) / np.diff(self.t)))
+
+
+    def csv_data(self, course):
+        """
+        Returns rows of time, index, rover pos and target pos,
+        for analyzing the path intersection problem.
+        """
+        csv_data_out = [['time', 'index', 'rover_pos_x', 'rover_pos_y', 'target_pos_x', 'target_pos_y']]
+        csv_data_out.extend(zip(self.t[1:].tolist(), self.target_ind[1:].tolist(),
+                                self.x[1:].tolist(), self.y[1:].tolist(),
+                                course.cx[self.target_ind[1:]].tolist(), course.cy[self.target_ind[1:]].tolist()))
+        return csv_data_out
+
+
+    def save_csv(self, filename, course):
+        """
+        Saves csv_data() rows to filename.
+        """
+        return save_csv_file(filename, self.csv_data(course))
+
+
+    def create_plots(self, course, rover_model=None, show=True, figure_name=None):
+        """
+        Plots course and trajectory with RoverModel.create_plots().
+        """
+        rover_model = rover_model or RoverModel(self.x[0], self.y[0])
+        rover_model.create_plots(course.cx, course.cy, self.x, self.y, self.t, self.v, self.yaw,
+                                 self.index_slope(), show, figure_name)
+
+
+
+
 # def run_red_rover_model(Lf=0.5, row_step_size=2):
-def run_red_rover_model(initial_pos, final_pos, x_path, y_path):
+def run_red_rover_model(initial_pos, final_pos, x_path, y_path, Lf=2.5, course=None,
+                        show=True, figure_name=None, csv_filename=None):
     """
     Incrementing lookahead for testing, saving plots of pngs
     Input: Lf - look-ahead distance in meters
+           course - optional pure_pursuit.Course of x_path, y_path,
+                    to reuse one preprocessed course across runs
+           show - display plot window
+           figure_name, csv_filename - optional plot image and CSV outputs
+    Returns: SimulationResult
     """
 
     T = 60  # total time of model, units of seconds
     V = 0.447  # rover's target velocity in m/s
     Kp = 1.0  # proportional gain for rover's velocity
-    Lf = 2.5
     row_step_size = 2
 
     # x0, y0 = 259551, 3.48472e6  # Initial rover starting position (original, works)
@@ -278,60 +392,247 @@ def run_red_rover_model(initial_pos, final_pos, x_path, y_path):
 
     x0 = initial_pos[0]
     y0 = initial_pos[1]
-    cx, cy = x_path, y_path
+    if course is None:
+        course = Course(x_path, y_path)  # spatial index + arc-length of course
 
     rover_model = RoverModel(x0, y0, Lf, T, V)  # initialize rover model
-    pure_pursuit_model = PurePursuitModel(Lf, Kp)  # initialize pure pursuit model
-    state = State(x=x0, y=y0, yaw=0.0, v=0.0)  # initialize current state of rover
 
-    lastIndex = len(cx) - 1
-    time = 0.0
-    x = [state.x]
-    y = [state.y]
-    yaw = [state.yaw]
-    v = [state.v]
-    t = [0.0]
-    ind, ind_slope = [], [0]
-    csv_data_out = [['time', 'index', 'rover_pos_x', 'rover_pos_y', 'target_pos_x', 'target_pos_y']]  # cols: index, time, rover_pos, target_pos
+    result = simulate_red_rover_model(course, (x0, y0), Lf, Kp, rover_model.V, T=rover_model.T)
 
-    print("Rover starting position: ({}, {})".format(x0, y0))
-    print("Last index of course: {}".format(lastIndex))
+    # Saving output CSV for analyzing turn position and index
+    # for path intersection problem:
+    # csv_filename = 'Data/2018-01-15/path_cross_example_data_2.csv'
+    if csv_filename:
+        result.save_csv(csv_filename, course)
+        logger.info("CSV {} saved.".format(csv_filename))
 
-    target_ind = pure_pursuit_model.calc_target_index(state, cx, cy)
-    ind.append(target_ind)  # index list for calculating slope
+    # Creates plots of red rover's course and path:
+    if show or figure_name:
+        result.create_plots(course, rover_model, show, figure_name)
+
+    return result
 
-    print("Rover heading to point: ({}, {})".format(cx[target_ind], cy[target_ind]))
 
-    j = 0
-    while rover_model.T >= time and lastIndex > target_ind:
 
-        ai = pure_pursuit_model.PIDControl(rover_model.V, state.v)
-        di, target_ind = pure_pursuit_model.pure_pursuit_control(state, cx, cy, target_ind)
-        state = state.update(state, ai, di)
 
+
+def course_segment_index(course):
+    """
+    red_rover_cross_track.SegmentIndex of a pure_pursuit.Course,
+    built on first use and kept on the course for later runs.
+    """
+    if getattr(course, 'segment_index', None) is None:
+        course.segment_index = SegmentIndex(course.cx, course.cy)
+    return course.segment_index
+
+
+def simulate_red_rover_model(course, initial_pos, Lf=2.5, Kp=1.0, V=0.447, dt=0.2, T=60.0):
+    """
+    Runs the pure pursuit model over a course without any
+    plotting or printing, for batch runs like run_parameter_sweep().
+    Trajectory buffers are preallocated from T / dt and
+    progress is logged at DEBUG level.
+
+    Inputs:
+        + course - pure_pursuit.Course to follow
+        + initial_pos - rover starting position (x, y)
+        + Lf, Kp, V, dt, T - look-ahead [m], speed gain, target speed [m/s],
+            time step [s] and total model time [s]
+    Returns: SimulationResult
+    """
+    pure_pursuit_model = PurePursuitModel(Lf, Kp)
+    state = State(x=initial_pos[0], y=initial_pos[1], yaw=0.0, v=0.0, dt=dt)
+
+    lastIndex = len(course) - 1
+    _max_steps = int(np.floor(T / dt + 1e-9)) + 3
+    t, x, y, yaw, v = [np.zeros(_max_steps) for _ in range(5)]
+    ind = np.zeros(_max_steps, dtype=np.int64)
+
+    logger.debug("Rover starting position: ({}, {})".format(state.x, state.y))
+    logger.debug("Last index of course: {}".format(lastIndex))
+
+    time = 0.0
+    step = 0
+    target_ind = pure_pursuit_model.calc_target_index(state, course)
+    t[0], x[0], y[0], yaw[0], v[0], ind[0] = time, state.x, state.y, state.yaw, state.v, target_ind
+
+    while T >= time and lastIndex > target_ind and step + 1 < _max_steps:
+        ai = pure_pursuit_model.PIDControl(V, state.v)
+        di, target_ind = pure_pursuit_model.pure_pursuit_control(state, course, target_ind)
+        state = state.update(state, ai, di)
         time = time + state.dt
 
-        print("Time: {}".format(time))
-        print("Rover's updated position: ({}, {})".format(state.x, state.y))
-        print("Rover's target position: ({}, {})".format(cx[target_ind], cy[target_ind]))
+        step += 1
+        t[step], x[step], y[step], yaw[step], v[step], ind[step] = time, state.x, state.y, state.yaw, state.v, target_ind
 
-        x.append(state.x)
-        y.append(state.y)
-        yaw.append(state.yaw)
-        v.append(state.v)
-        t.append(time)
-        ind.append(target_ind)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Time: {}, rover position: ({}, {}), target position: ({}, {})".format(
+                time, state.x, state.y, course.cx[target_ind], course.cy[target_ind]))
 
-        csv_data_out.append([time, target_ind, state.x, state.y, cx[target_ind], cy[target_ind]])
+    _n = step + 1
+    result = SimulationResult(t[:_n], x[:_n], y[:_n], yaw[:_n], v[:_n], ind[:_n],
+                              completion_time=time if target_ind >= lastIndex else None)
 
-        slope_index = (ind[j + 1] - ind[j]) / (t[j + 1] - t[j])
-        ind_slope.append(slope_index)
-        j += 1
+    # distance from each rover position to the closest course segment:
+    _errors = course_segment_index(course).query(result.x, result.y)
+    result.cross_track = _errors['cross_track']
+    result.along_track = _errors['along_track']
+    result.cross_track_stats = cross_track_stats(result.cross_track)
+    result.cross_track_mean = result.cross_track_stats['mean']
+    result.cross_track_rms = result.cross_track_stats['rms']
+    result.cross_track_max = result.cross_track_stats['max']
 
-    # Creates plots of red rover's course and path:
-    rover_model.create_plots(cx, cy, x, y, t, v, yaw, ind_slope)
+    return result
 
 
+def simulate_red_rover_batch(course, initial_poses, Lf=2.5, Kp=1.0, V=0.447, dt=0.2, T=60.0,
+                                gps_sigma=0.0, seed=None):
+    """
+    Runs the pure pursuit model for K rovers at once as one
+    vectorized loop over time, e.g., for Monte-Carlo checks of
+    controller robustness to start pose and GPS noise.
+
+    Inputs:
+        + course - pure_pursuit.Course to follow
+        + initial_poses - (K, 2) array of starting x, y, or (K, 3) with yaw
+        + Lf, Kp, V - scalars, or length K arrays for K parameter sets
+        + dt, T - time step [s] and total model time [s]
+        + gps_sigma - std dev [m] of noise on the position the controller sees
+        + seed - random seed for the GPS noise
+    Returns: dict with 't' (steps,) and 'x', 'y', 'yaw', 'v', 'target_ind'
+        (steps, K) arrays, plus 'completion_time' (K,), NaN for rovers
+        that didn't reach the end of the course within T.
+    """
+    initial_poses = np.atleast_2d(np.asarray(initial_poses, dtype=np.float64))
+    _yaw0 = initial_poses[:, 2] if initial_poses.shape[1] > 2 else 0.0
+    _rng = np.random.RandomState(seed)
+
+    pure_pursuit_model = PurePursuitModel(np.asarray(Lf, dtype=np.float64), np.asarray(Kp, dtype=np.float64))
+    states = BatchState(initial_poses[:, 0], initial_poses[:, 1], yaw=_yaw0, v=0.0, dt=dt)
+    K = len(states)
+
+    lastIndex = len(course) - 1
+    _max_steps = int(np.floor(T / dt + 1e-9)) + 2
+    t = np.zeros(_max_steps)
+    x, y, yaw, v = [np.zeros((_max_steps, K)) for _ in range(4)]
+    target_ind = np.zeros((_max_steps, K), dtype=np.int64)
+    completion_time = np.full(K, np.nan)
+
+    _, ind = course.tree.query(np.column_stack((states.x, states.y)))
+    ind = course.look_ahead_index(ind, pure_pursuit_model.Lf) * np.ones(K, dtype=np.int64)
+    x[0], y[0], yaw[0], v[0], target_ind[0] = states.x, states.y, states.yaw, states.v, ind
+
+    time = 0.0
+    step = 0
+    active = ind < lastIndex
+    while T >= time and active.any():
+        _x_meas = states.x + _rng.normal(0.0, gps_sigma, K) if gps_sigma else states.x
+        _y_meas = states.y + _rng.normal(0.0, gps_sigma, K) if gps_sigma else states.y
+
+        ai = pure_pursuit_model.PIDControl(V, states.v)
+        di, _new_ind = pure_pursuit_model.batch_pure_pursuit_control(states, course, ind, _x_meas, _y_meas)
+        states.update(ai, di, active)
+        ind = np.where(active, _new_ind, ind)
+
+        time = time + dt
+        step += 1
+        t[step] = time
+        x[step], y[step], yaw[step], v[step], target_ind[step] = states.x, states.y, states.yaw, states.v, ind
+
+        _finished = active & (ind >= lastIndex)
+        completion_time[_finished] = time
+        active = active & ~_finished
+
+    _n = step + 1
+    return {
+        't': t[:_n],
+        'x': x[:_n],
+        'y': y[:_n],
+        'yaw': yaw[:_n],
+        'v': v[:_n],
+        'target_ind': target_ind[:_n],
+        'completion_time': completion_time
+    }
+
+
+def sweep_grid(Lf=(2.5,), Kp=(1.0,), V=(0.447,), row_step_size=(2,), dt=(0.2,)):
+    """
+    Returns list of parameter dicts for every combination
+    of the given Lf, Kp, V, row_step_size and dt values.
+    """
+    _keys = ('Lf', 'Kp', 'V', 'row_step_size', 'dt')
+    return [dict(zip(_keys, _values)) for _values in itertools.product(Lf, Kp, V, row_step_size, dt)]
+
+
+_sweep_path = {}  # course data of a sweep worker process
+
+
+def _init_sweep_worker(x_path, y_path, initial_pos, T):
+    """
+    Pool initializer, keeps the full path in each worker
+    so it's only sent once instead of with every run.
+    """
+    _sweep_path.clear()
+    _sweep_path.update({'x': x_path, 'y': y_path, 'initial_pos': initial_pos, 'T': T, 'courses': {}})
+
+
+def _run_sweep_params(params):
+    """
+    Runs one simulation of a sweep in a worker process.
+    Courses are built once per row_step_size per worker.
+    """
+    _step = int(params['row_step_size'])
+    _courses = _sweep_path['courses']
+    if _step not in _courses:
+        _courses[_step] = Course(_sweep_path['x'][::_step], _sweep_path['y'][::_step])
+
+    result = simulate_red_rover_model(_courses[_step], _sweep_path['initial_pos'],
+                    params['Lf'], params['Kp'], params['V'], params['dt'], _sweep_path['T'])
+    result.params = params
+    return result
+
+
+def run_parameter_sweep(initial_pos, x_path, y_path, params_list, T=60.0, processes=None):
+    """
+    Runs simulate_red_rover_model() for every parameter dict
+    in params_list (see sweep_grid()) across a process pool,
+    with no GUI.
+
+    Inputs:
+        + initial_pos - rover starting position (x, y)
+        + x_path, y_path - full course, decimated per run by row_step_size
+        + params_list - list of dicts with Lf, Kp, V, row_step_size and dt
+        + processes - pool size, defaults to number of cores
+    Returns: list of SimulationResult in params_list order, each with its params
+    """
+    _initargs = (np.asarray(x_path, dtype=np.float64), np.asarray(y_path, dtype=np.float64),
+                    tuple(initial_pos[:2]), T)
+
+    pool = multiprocessing.Pool(processes, initializer=_init_sweep_worker, initargs=_initargs)
+    try:
+        results = pool.map(_run_sweep_params, params_list, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
+
+
+def rank_sweep_results(results, key='rms'):
+    """
+    Scores run_parameter_sweep() results by a cross-track stat
+    (e.g., 'rms', 'max', 'p95', see red_rover_cross_track.cross_track_stats).
+    Returns: list of dicts of each run's params, cross-track stats and
+        completion_time, best (lowest key) first
+    """
+    _rows = []
+    for result in results:
+        _row = dict(result.params or {})
+        _row.update(result.cross_track_stats)
+        _row['completion_time'] = result.completion_time
+        _rows.append(_row)
+    return sorted(_rows, key=lambda _row: _row[key])
+
 
 
 
@@ -346,10 +647,11 @@ if __name__ == '__main__':
     Plots two graphs: position vs time, and vecolity vs time
     """
 
-    # Creating plots with varying look-aheads:
+    # Creating plots with varying look-aheads (course preprocessed once):
+    # course = Course(x_path, y_path)
     # for i in range(1, 20):
     #     Lf = i / 10.0  # incrementing look ahead
-    #     run_red_rover_model(Lf)
+    #     run_red_rover_model(initial_pos, final_pos, x_path, y_path, Lf, course)
 
     # Stepping through path row skipping amounts to see
     # how it affects the model:
@@ -357,5 +659,10 @@ if __name__ == '__main__':
     #     row_step_size = i / 1.0
     #     run_red_rover_model(0.5, row_step_size)
 
+    # Sweeping look-aheads and row steps in parallel, no plots:
+    # params_list = sweep_grid(Lf=[i / 10.0 for i in range(1, 20)], row_step_size=range(1, 11))
+    # results = run_parameter_sweep(initial_pos, x_path, y_path, params_list)
+    # best = rank_sweep_results(results, 'p95')[0]
+
     # Run model a single time w/ defaults:
     run_red_rover_model(0.5, 1)  # Defaults: Lf=0.5, rows_step_size=2
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Track simplification for the red rover map, GPX and plot outputs.
+
+Drops GPS fixes that don't change a track's shape by more than a
+tolerance in metres, measured in UTM space: long straight field
+passes shrink to a few points while turns keep their shape.
+Two methods:
+	+ 'dp' - Douglas-Peucker, keeps every point farther than
+		tolerance from the simplified line.
+	+ 'vw' - Visvalingam-Whyatt, drops the points whose triangle with
+		their neighbors has the smallest area, until every area is
+		at least tolerance**2.
+"""
+
+from red_rover_utm import latlon_to_utm
+import numpy as np
+import heapq
+
+
+
+def _segment_distances(x, y, x0, y0, x1, y1):
+	"""
+	Distances of points x, y to the segment from (x0, y0) to (x1, y1).
+	"""
+	_dx, _dy = x1 - x0, y1 - y0
+	_length_sq = _dx * _dx + _dy * _dy
+	if _length_sq == 0:
+		return np.hypot(x - x0, y - y0)
+	_t = np.clip(((x - x0) * _dx + (y - y0) * _dy) / _length_sq, 0.0, 1.0)
+	return np.hypot(x - (x0 + _t * _dx), y - (y0 + _t * _dy))
+
+
+def douglas_peucker(x, y, tolerance):
+	"""
+	Douglas-Peucker simplification, without recursion: a stack of
+	index ranges, each range's farthest point found with one
+	vectorized distance computation.
+	Returns: sorted indexes of the points to keep
+	"""
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	if len(x) < 3:
+		return np.arange(len(x))
+
+	_keep = np.zeros(len(x), dtype=bool)
+	_keep[0] = _keep[-1] = True
+	_ranges = [(0, len(x) - 1)]
+	while _ranges:
+		_start, _end = _ranges.pop()
+		if _end - _start < 2:
+			continue
+		_distances = _segment_distances(x[_start + 1:_end], y[_start + 1:_end], x[_start], y[_start], x[_end], y[_end])
+		_farthest = int(np.argmax(_distances))
+		if _distances[_farthest] > tolerance:
+			_split = _start + 1 + _farthest
+			_keep[_split] = True
+			_ranges.append((_start, _split))
+			_ranges.append((_split, _end))
+	return np.flatnonzero(_keep)
+
+
+def visvalingam(x, y, tolerance):
+	"""
+	Visvalingam-Whyatt simplification, removing the point of smallest
+	effective area (from a heap) until all areas are >= tolerance**2.
+	Returns: sorted indexes of the points to keep
+	"""
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	if len(x) < 3:
+		return np.arange(len(x))
+
+	def area(i, j, k):
+		return abs((x[j] - x[i]) * (y[k] - y[i]) - (x[k] - x[i]) * (y[j] - y[i])) / 2.0
+
+	_min_area = tolerance**2
+	_prev = list(range(-1, len(x) - 1))
+	_next = list(range(1, len(x) + 1))
+	_areas = np.full(len(x), np.inf)
+	_areas[1:-1] = np.abs((x[1:-1] - x[:-2]) * (y[2:] - y[:-2]) - (x[2:] - x[:-2]) * (y[1:-1] - y[:-2])) / 2.0
+	_heap = [(_areas[_i], _i) for _i in range(1, len(x) - 1)]
+	heapq.heapify(_heap)
+	_keep = np.ones(len(x), dtype=bool)
+
+	while _heap:
+		_area, _i = heapq.heappop(_heap)
+		if not _keep[_i] or _area != _areas[_i]:
+			continue  # removed, or stale area
+		if _area >= _min_area:
+			break
+		_keep[_i] = False
+		_p, _n = _prev[_i], _next[_i]
+		_next[_p], _prev[_n] = _n, _p
+		for _j in (_p, _n):
+			if 0 < _j < len(x) - 1:
+				# area never drops below the removed point's (keeps order of removal):
+				_areas[_j] = max(area(_prev[_j], _j, _next[_j]), _area)
+				heapq.heappush(_heap, (_areas[_j], _j))
+	return np.flatnonzero(_keep)
+
+
+METHODS = {
+	'dp': douglas_peucker,
+	'vw': visvalingam
+}
+
+
+def simplify_indexes(x, y, tolerance, method='dp'):
+	"""
+	Indexes of the points of an x, y (metres, e.g. UTM) track
+	to keep, simplified with method ('dp' or 'vw') to tolerance [m].
+	NaN points are dropped.
+	"""
+	if method not in METHODS:
+		raise ValueError("method must be one of {}".format(sorted(METHODS)))
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	_finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+	return _finite[METHODS[method](x[_finite], y[_finite], tolerance)]
+
+
+def simplify_latlon(lats, lons, tolerance, method='dp'):
+	"""
+	Indexes of the lat/lon points to keep, simplified to tolerance [m]
+	in the UTM zone of the track.
+	"""
+	lats = np.asarray(lats, dtype=np.float64)
+	lons = np.asarray(lons, dtype=np.float64)
+	_finite = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+	if len(_finite) < 3:
+		return _finite
+	_eastings, _northings, _, _ = latlon_to_utm(lats[_finite], lons[_finite])
+	return _finite[simplify_indexes(_eastings, _northings, tolerance, method)]
@@ -0,0 +1,79 @@
+"""
+Batch lat/lon <--> UTM projection for the red rover tools.
+
+Converts whole numpy arrays of GPS fixes in one vectorized
+utm call, instead of calling utm.from_latlon/utm.to_latlon
+once per CSV row. The zone is detected once per array from
+the data, rather than hardcoding zone 17.
+"""
+
+import numpy as np
+import utm
+
+
+
+def detect_zone(lats, lons):
+	"""
+	Returns (zone number, zone letter) of the first
+	finite lat/lon pair in the arrays. All points of an
+	array get projected into this one zone, so a track that
+	crosses a zone boundary stays continuous.
+	"""
+	lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+	lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+	_finite = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+	if not _finite.size:
+		raise ValueError("no finite lat/lon values to detect UTM zone from")
+	_lat, _lon = lats[_finite[0]], lons[_finite[0]]
+	return utm.latlon_to_zone_number(_lat, _lon), utm.latitude_to_zone_letter(_lat)
+
+
+def latlon_to_utm(lats, lons, zone_number=None, zone_letter=None):
+	"""
+	Converts arrays of lat/lon to UTM in a single call.
+	Inputs:
+		+ lats, lons - array_like of decimal degrees
+		+ zone_number, zone_letter - zone to project into,
+			detected from the data if None
+	Returns: eastings, northings (np.ndarray), zone number, zone letter
+	"""
+	lats = np.asarray(lats, dtype=np.float64)
+	lons = np.asarray(lons, dtype=np.float64)
+	if zone_number is None:
+		zone_number, _detected_letter = detect_zone(lats, lons)
+		zone_letter = zone_letter or _detected_letter
+	elif zone_letter is None:
+		zone_letter = detect_zone(lats, lons)[1]
+	if not lats.size:
+		return np.array([]), np.array([]), zone_number, zone_letter
+	_eastings, _northings, _, _ = utm.from_latlon(lats, lons, zone_number, zone_letter)
+	return _eastings, _northings, zone_number, zone_letter
+
+
+def utm_to_latlon(eastings, northings, zone_number, zone_letter):
+	"""
+	Converts arrays of UTM eastings/northings in one zone
+	to lat/lon in a single call.
+	Returns: lats, lons (np.ndarray)
+	"""
+	eastings = np.asarray(eastings, dtype=np.float64)
+	northings = np.asarray(northings, dtype=np.float64)
+	if not eastings.size:
+		return np.array([]), np.array([])
+	_lats, _lons = utm.to_latlon(eastings, northings, int(zone_number), str(zone_letter))
+	return np.asarray(_lats), np.asarray(_lons)
+
+
+def zone_from_columns(csv_data, number_header='zone number', letter_header='zone letter'):
+	"""
+	Returns (zone number, zone letter) from the zone columns
+	written by GPSPlot.add_utm_to_csvdata, or None if the data
+	has no zone columns.
+	"""
+	if number_header not in csv_data or letter_header not in csv_data:
+		return None
+	_numbers = csv_data[number_header]
+	_letters = csv_data[letter_header]
+	if not len(_numbers):
+		return None
+	return int(_numbers[0]), str(_letters[0])
@@ -0,0 +1,80 @@
+"""
+Checks that the 'sweep' and 'mask' mpd methods of
+algorithms/detect_peaks.py return the same peaks, and times
+them, on random signals or on a logged column, e.g.:
+
+python scripts/check_detect_peaks.py Data/2017-10-04/turn_test_5min_single_avg_20171004_pivot.csv field.data
+"""
+
+from __future__ import division, print_function
+import numpy as np
+import time
+import csv
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from algorithms import detect_peaks
+
+
+
+def check_mpd_equivalence(x=None, mpds=(2, 5, 20, 100), trials=50, seed=0):
+    """Check that the 'sweep' and 'mask' mpd methods return the same peaks.
+
+    Runs `detect_peaks` with both methods on `x` (or, if None, on random
+    noisy sines with flat and repeated peaks and NaN's) for every `mpd` in
+    `mpds`, with and without `kpsh` and `valley`, and every `edge`.
+
+    Returns
+    -------
+    mismatches : list
+        (trial, mpd, kpsh, valley, edge) of every case that differs,
+        empty if both methods agree.
+    """
+    if x is not None:
+        signals = [np.asarray(x, dtype='float64')]
+    else:
+        rng = np.random.RandomState(seed)
+        signals = []
+        for _ in range(trials):
+            n = rng.randint(3, 2000)
+            t = np.linspace(0, 1, n)
+            signal = np.sin(2*np.pi*rng.randint(1, 50)*t) + rng.randn(n)/5
+            signal = np.round(signal, rng.randint(0, 3))  # flat/equal peaks
+            signal[rng.randint(0, n, rng.randint(0, 3))] = np.nan
+            signals.append(signal)
+
+    mismatches = []
+    for trial, signal in enumerate(signals):
+        for mpd in mpds:
+            for kpsh in (False, True):
+                for valley in (False, True):
+                    for edge in (None, 'rising', 'falling', 'both'):
+                        kwargs = dict(mpd=mpd, kpsh=kpsh, valley=valley,
+                                      edge=edge)
+                        sweep = detect_peaks.detect_peaks(
+                            signal, mpd_method='sweep', **kwargs)
+                        mask = detect_peaks.detect_peaks(
+                            signal, mpd_method='mask', **kwargs)
+                        if not np.array_equal(sweep, mask):
+                            mismatches.append((trial, mpd, kpsh, valley,
+                                               edge))
+    return mismatches
+
+
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        with open(sys.argv[1], 'r') as csv_file:
+            rows = list(csv.reader(csv_file))
+        column = rows[0].index(sys.argv[2])
+        data = np.array([float(row[column]) for row in rows[1:] if row])
+        for mpd_method in ('mask', 'sweep'):
+            start = time.time()
+            detect_peaks.detect_peaks(data, mpd=20, mpd_method=mpd_method)
+            print('%s: %.4f s' % (mpd_method, time.time() - start))
+    else:
+        data = None
+    mismatches = check_mpd_equivalence(data)
+    print('%d mismatches %s' % (len(mismatches), mismatches[:10]))
@@ -0,0 +1,66 @@
+"""
+Checks that algorithms/savitzky_golay.py's SavitzkyGolayStream, fed
+a signal in chunks, returns the same samples as savitzky_golay of the
+whole signal, for 1-D and 2-D signals of every length from 1 up past
+the window size, e.g.:
+
+python scripts/check_savitzky_golay.py
+"""
+
+from __future__ import division, print_function
+import numpy as np
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from algorithms.savitzky_golay import savitzky_golay, SavitzkyGolayStream
+
+
+
+def check_stream_equivalence(filters=((11, 3, 0), (11, 3, 1), (5, 2, 0), (31, 4, 0)),
+                             chunk_sizes=(1, 2, 3, 7, None), seed=0):
+    """Check that concatenated update()/flush() output equals savitzky_golay.
+
+    For every (window_size, order, deriv) in `filters`, streams random
+    signals of every length n from 1 to window_size + 2, shaped (n,) and
+    (n, 2), in chunks of every size in `chunk_sizes` (None - one chunk,
+    plus an empty chunk), and compares with savitzky_golay of the whole
+    signal, which must return n samples.
+
+    Returns
+    -------
+    mismatches : list
+        (window_size, order, deriv, n, ndim, chunk_size) of every case
+        that differs or raises, empty if the stream and savitzky_golay agree.
+    """
+    rng = np.random.RandomState(seed)
+    mismatches = []
+    for window_size, order, deriv in filters:
+        for n in range(1, window_size + 3):
+            for shape in ((n,), (n, 2)):
+                y = rng.randn(*shape)
+                for chunk_size in chunk_sizes:
+                    case = (window_size, order, deriv, n, len(shape), chunk_size)
+                    try:
+                        expected = savitzky_golay(y, window_size, order, deriv)
+                        stream = SavitzkyGolayStream(window_size, order, deriv)
+                        if chunk_size is None:
+                            chunks = [y, y[:0]]
+                        else:
+                            chunks = [y[i:i + chunk_size] for i in range(0, n, chunk_size)]
+                        outputs = [stream.update(chunk) for chunk in chunks]
+                        outputs.append(stream.flush())
+                        streamed = np.concatenate(outputs)
+                    except ValueError:
+                        mismatches.append(case)
+                        continue
+                    if expected.shape != shape or streamed.shape != shape or not np.allclose(streamed, expected):
+                        mismatches.append(case)
+    return mismatches
+
+
+
+
+if __name__ == '__main__':
+    mismatches = check_stream_equivalence()
+    print('%d mismatches %s' % (len(mismatches), mismatches[:10]))